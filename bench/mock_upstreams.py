@@ -0,0 +1,201 @@
+"""
+Mock local do ActiveCampaign, do Pipedrive e do Data Lake para o benchmark.
+
+Responde pelos mesmos paths usados pelos serviços, independentemente do host:
+- ActiveCampaign: /api/3/contacts (com include=fieldValues), /api/3/contacts/{id},
+  /api/3/contacts/{id}/fieldValues e /api/3/fields
+- Pipedrive: /persons, /persons/search, /deals, /stages, /personFields e /dealFields
+- Data Lake: /api/azure-datalake/uploadfile
+
+Latência, taxa de erro e limite de requisições (429) são configuráveis.
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+UTM_FIELD_IDS = ("16", "17", "18", "19")
+UTM_FIELD_TITLES = {"16": "UTM Campaign", "17": "UTM Source", "18": "UTM Medium", "19": "UTM Content"}
+PIPEDRIVE_FIELDS = [
+    {"key": "name", "name": "Nome"},
+    {"key": "0722ce86e5e4d808c95f3c164aff5d396761222d", "name": "UTM Campaign"},
+    {"key": "98b877f5c8ed5d7a0e6aae18b9dfb290380181ea", "name": "UTM Source"},
+    {"key": "288859c4fdfcbbf7d50a5e0a036f5d0d8013f0b0", "name": "UTM Medium"},
+    {"key": "ec5ea0971fbca9f9250d4cf2ccb7ba5b11e59fde", "name": "UTM Content"},
+    {"key": "cbcda7fdd568ebeb951bf22f08196489546cd038", "name": "Email personalizado"},
+    {"key": "25b40c8ab005c52701d02831eafe90429b2f139a", "name": "Telefone personalizado"}
+]
+PIPEDRIVE_DEAL_FIELDS = [
+    {"key": "title", "name": "Título"},
+    {"key": "5d1a2f0e3c4b8a9d7e6f1029384756abcdef0123", "name": "UTM Campaign"},
+    {"key": "a9b8c7d6e5f40312efcdab9876543210fedcba98", "name": "UTM Source"}
+]
+
+
+@dataclass
+class MockConfig:
+    contacts: int = 1000
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0
+    rate_limit: int = 0                 # requisições por janela no Pipedrive; 0 desliga o 429
+    rate_window_seconds: float = 2.0
+    seed: int = 42
+
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.calls = Counter()
+        self.next_id = 1
+        # Muda a cada cenário para que o índice de deduplicação não reaproveite leads de outro cenário
+        self.email_domain = "example.com"
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    async def delay(self):
+        latency = self.config.latency_ms + self.random.uniform(-1, 1) * self.config.jitter_ms
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def should_fail(self):
+        return self.config.error_rate and self.random.random() < self.config.error_rate
+
+    def rate_limited(self):
+        """Janela fixa no estilo do Pipedrive; devolve (limitado, restante, reset)."""
+        if not self.config.rate_limit:
+            return False, None, None
+        now = time.monotonic()
+        if now - self._window_start >= self.config.rate_window_seconds:
+            self._window_start, self._window_count = now, 0
+        reset = max(self.config.rate_window_seconds - (now - self._window_start), 0)
+        if self._window_count >= self.config.rate_limit:
+            return True, 0, reset
+        self._window_count += 1
+        return False, self.config.rate_limit - self._window_count, reset
+
+
+def create_mock_app(config: MockConfig):
+    app = FastAPI()
+    state = MockState(config)
+    app.state.mock = state
+
+    def contact(index: int):
+        return {
+            "id": str(index),
+            "email": f"lead{index}@{state.email_domain}",
+            "phone": f"+55 11 9{index:08d}",
+            "firstName": "Lead",
+            "lastName": str(index),
+            "created_timestamp": "2024-01-01 00:00:00",
+            "udate": "2024-01-01T00:00:00-03:00",
+            "links": {"fieldValues": f"https://ac.mock/api/3/contacts/{index}/fieldValues"}
+        }
+
+    def field_values(index: int):
+        return [
+            {"contact": str(index), "field": field_id, "value": f"{UTM_FIELD_TITLES[field_id]} {index % 10}"}
+            for field_id in UTM_FIELD_IDS
+        ]
+
+    async def upstream_response(name: str, body_factory, status_code: int = 200, pipedrive: bool = False):
+        state.calls[name] += 1
+        await state.delay()
+        headers = {}
+        if pipedrive:
+            limited, remaining, reset = state.rate_limited()
+            if limited:
+                state.calls[f"{name} 429"] += 1
+                return JSONResponse(
+                    {"success": False, "error": "Rate limit exceeded"},
+                    status_code=429,
+                    headers={"retry-after": f"{reset:.2f}", "x-ratelimit-remaining": "0"}
+                )
+            if remaining is not None:
+                headers = {
+                    "x-ratelimit-limit": str(config.rate_limit),
+                    "x-ratelimit-remaining": str(remaining),
+                    "x-ratelimit-reset": f"{reset:.2f}"
+                }
+        if state.should_fail():
+            state.calls[f"{name} error"] += 1
+            return JSONResponse({"error": "mock failure"}, status_code=500, headers=headers)
+        return JSONResponse(body_factory(), status_code=status_code, headers=headers)
+
+    # ActiveCampaign
+
+    @app.get("/api/3/contacts")
+    async def list_contacts(request: Request):
+        params = request.query_params
+        offset, limit = int(params.get("offset", 0)), int(params.get("limit", 20))
+        indexes = range(offset, min(offset + limit, config.contacts))
+
+        def body():
+            result = {"contacts": [contact(i) for i in indexes], "meta": {"total": str(config.contacts)}}
+            if params.get("include") == "fieldValues":
+                result["fieldValues"] = [fv for i in indexes for fv in field_values(i)]
+            return result
+        return await upstream_response("ac GET contacts", body)
+
+    @app.get("/api/3/contacts/{contact_id}")
+    async def get_contact(contact_id: int):
+        return await upstream_response("ac GET contact", lambda: {"contact": contact(contact_id)})
+
+    @app.get("/api/3/contacts/{contact_id}/fieldValues")
+    async def get_field_values(contact_id: int):
+        return await upstream_response("ac GET fieldValues", lambda: {"fieldValues": field_values(contact_id)})
+
+    @app.get("/api/3/fields")
+    async def list_fields():
+        fields = [{"id": field_id, "title": title} for field_id, title in UTM_FIELD_TITLES.items()]
+        return await upstream_response("ac GET fields", lambda: {"fields": fields, "meta": {"total": str(len(fields))}})
+
+    # Pipedrive (qualquer prefixo: /v1/persons, /v1/persons/persons, /api/v1/deals/deals…)
+
+    @app.post("/{prefix:path}persons")
+    async def create_person(prefix: str):
+        return await upstream_response("pipedrive POST persons", lambda: {"data": {"id": state.new_id()}}, 201, True)
+
+    @app.get("/{prefix:path}persons/search")
+    async def search_persons(prefix: str):
+        return await upstream_response("pipedrive GET persons/search", lambda: {"data": {"items": []}}, 200, True)
+
+    @app.get("/{prefix:path}persons")
+    async def list_persons(prefix: str):
+        return await upstream_response("pipedrive GET persons", lambda: {"data": []}, 200, True)
+
+    @app.post("/{prefix:path}deals")
+    async def create_deal(prefix: str):
+        return await upstream_response("pipedrive POST deals", lambda: {"data": {"id": state.new_id()}}, 201, True)
+
+    @app.get("/{prefix:path}personFields")
+    async def list_person_fields(prefix: str):
+        return await upstream_response("pipedrive GET personFields", lambda: {"data": PIPEDRIVE_FIELDS}, 200, True)
+
+    @app.get("/{prefix:path}dealFields")
+    async def list_deal_fields(prefix: str):
+        return await upstream_response("pipedrive GET dealFields", lambda: {"data": PIPEDRIVE_DEAL_FIELDS}, 200, True)
+
+    @app.get("/{prefix:path}stages")
+    async def list_stages(prefix: str):
+        stages = [
+            {"id": 33, "pipeline_id": 3, "order_nr": 1, "name": "Lead Frio"},
+            {"id": 34, "pipeline_id": 2, "order_nr": 1, "name": "Lead Frio"}
+        ]
+        return await upstream_response("pipedrive GET stages", lambda: {"data": stages}, 200, True)
+
+    # Data Lake
+
+    @app.post("/api/azure-datalake/uploadfile")
+    async def upload_file():
+        return await upstream_response("datalake POST uploadfile", lambda: {"status": "ok"})
+
+    return app
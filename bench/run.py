@@ -0,0 +1,192 @@
+"""
+Benchmark offline da API contra o mock local dos upstreams (bench/mock_upstreams.py).
+
+Exemplos:
+    python -m bench.run --scenario webhooks --requests 2000 --concurrency 50
+    python -m bench.run --scenario sync --contacts 1000 10000 100000 --sync-concurrency 20
+    python -m bench.run --scenario all --latency-ms 50 --error-rate 0.01 --rate-limit 80 --output bench.json
+
+Todo o tráfego de upstream vai para o mock em processo (httpx.ASGITransport), o estado
+local (fila, índices, cursores) fica num diretório temporário e a semente é fixa,
+então execuções em commits diferentes são comparáveis. O resultado é um JSON com
+requisições por segundo, latências p50/p95/p99 e a contagem de chamadas por upstream.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _prepare_environment(args):
+    # As configurações são lidas no import: o ambiente precisa estar pronto antes de importar a aplicação
+    os.environ.setdefault("AC_API_URL", "https://ac.mock")
+    os.environ.setdefault("AC_API_KEY", "bench")
+    os.environ.setdefault("PIPEDRIVE_API_URL", "https://api.pipedrive.mock/v1")
+    os.environ.setdefault("PIPEDRIVE_API_KEY", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench_state_")
+    if not args.rate_limit:
+        # Sem 429 no mock, o agendador não deve ser o gargalo medido
+        os.environ.setdefault("PIPEDRIVE_RATE_LIMIT", "1000000")
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, statuses):
+    return {
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            "max": round(max(latencies) * 1000, 2) if latencies else None
+        },
+        "statuses": statuses
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def run_webhooks(client, mock_state, args):
+    """Rajada de webhooks de leads distintos com `concurrency` requisições simultâneas."""
+    mock_state.calls.clear()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, statuses = [], {}
+
+    async def send(index):
+        async with semaphore:
+            data = {
+                "contact_email": f"burst{index}@example.com",
+                "contact_phone": f"+55 21 9{index:08d}",
+                "contact_first_name": "Burst",
+                "contact_last_name": str(index),
+                "contact_utm_campaign": "bench"
+            }
+            start = time.perf_counter()
+            response = await client.post("/webhook/pos_ia", data=data)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(index) for index in range(args.requests)))
+    result = summarize(latencies, time.perf_counter() - start, statuses)
+    result["upstream_calls"] = dict(mock_state.calls)
+    return result
+
+
+async def wait_for_job(client, job_id, interval=0.05):
+    """Consulta o job até ele terminar."""
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(interval)
+
+
+async def run_sync(client, mock_state, size, args):
+    """Sincronização completa de uma lista com `size` contatos."""
+    mock_state.calls.clear()
+    mock_state.config.contacts = size
+    mock_state.email_domain = f"sync{size}.example.com"
+    params = {"concurrency": args.sync_concurrency}
+    if args.batch_size:
+        params["batch_size"] = args.batch_size
+
+    start = time.perf_counter()
+    response = await client.post(f"/sync_contacts/{args.list_id}/{args.pipeline_id}", params=params)
+    job = await wait_for_job(client, response.json()["job_id"])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "contacts": size,
+        "status": job["status"],
+        "elapsed_seconds": round(elapsed, 3),
+        "contacts_per_second": round(size / elapsed, 2) if elapsed else None,
+        "failed": job["failed"],
+        "upstream_calls": dict(mock_state.calls)
+    }
+
+
+async def main(args):
+    _prepare_environment(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import httpx
+    from bench.mock_upstreams import MockConfig, create_mock_app
+    from services import http_client
+    import main as api
+
+    mock_app = create_mock_app(MockConfig(
+        contacts=max(args.contacts),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed
+    ))
+    mock_state = mock_app.state.mock
+    http_client.use_transport(httpx.ASGITransport(app=mock_app))
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "scenarios": {}
+    }
+
+    async with api.lifespan(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            if args.scenario in ("webhooks", "all"):
+                report["scenarios"]["webhooks"] = await run_webhooks(client, mock_state, args)
+            if args.scenario in ("sync", "all"):
+                report["scenarios"]["sync"] = [
+                    await run_sync(client, mock_state, size, args) for size in args.contacts
+                ]
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline da API com upstreams simulados.")
+    parser.add_argument("--scenario", choices=("webhooks", "sync", "all"), default="all")
+    parser.add_argument("--requests", type=int, default=1000, help="webhooks na rajada")
+    parser.add_argument("--concurrency", type=int, default=50, help="webhooks simultâneos")
+    parser.add_argument("--contacts", type=int, nargs="+", default=[1000], help="tamanhos de lista (ex.: 1000 10000 100000)")
+    parser.add_argument("--sync-concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=0)
+    parser.add_argument("--list-id", type=int, default=61)
+    parser.add_argument("--pipeline-id", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latência média do mock")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500 do mock")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requisições por janela de 2s no Pipedrive (429 acima disso)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="grava o JSON do resultado neste arquivo")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
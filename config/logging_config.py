@@ -0,0 +1,93 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from config.settings import LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_SAMPLE_RATE, LOG_REDACT_PII
+
+# Atributos padrão de um LogRecord; o que sobrar veio de `extra=` e vira campo do JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+# Chaves com dados pessoais mascaradas nos payloads
+_PII_KEYS = ("email", "phone", "telefone", "name", "nome")
+
+# Bibliotecas muito verbosas (o httpx registraria cada URL, com o api_token do Pipedrive)
+_QUIET_LOGGERS = ("httpx", "httpcore", "python_multipart", "multipart")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma única linha JSON."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """
+    Configura o logger raiz: os registros entram numa fila em memória (QueueHandler)
+    e uma thread dedicada (QueueListener) formata e escreve no stdout,
+    então as requisições nunca esperam pela escrita.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    for name in _QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Esvazia a fila de logs e para a thread de escrita."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def redact(payload):
+    """Cópia do payload com email, telefone e nome mascarados."""
+    if isinstance(payload, dict):
+        return {
+            key: "***" if value and any(pii in str(key).lower() for pii in _PII_KEYS) else redact(value)
+            for key, value in payload.items()
+        }
+    if isinstance(payload, list):
+        return [redact(value) for value in payload]
+    return payload
+
+
+def log_payload(logger: logging.Logger, message: str, payload):
+    """Registra o payload em DEBUG, por amostragem (LOG_PAYLOAD_SAMPLE_RATE) e mascarado (LOG_REDACT_PII)."""
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={"payload": redact(payload) if LOG_REDACT_PII else payload})
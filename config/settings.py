@@ -1,25 +1,167 @@
+import functools
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
 
-load_dotenv()
 
-# Configuração das APIs
-ACTIVE_CAMPAIGN_API_URL = os.getenv("AC_API_URL") + "/api/3/contacts"
-ACTIVE_CAMPAIGN_API_KEY = os.getenv("AC_API_KEY")
-AC_LIST_ID = os.getenv("AC_LIST_ID")
+def _find_dotenv():
+    """Procura um .env a partir deste diretório, subindo até a raiz (como o load_dotenv)."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+# O python-dotenv só é importado quando existe um .env (em produção as variáveis vêm do ambiente)
+_dotenv_path = _find_dotenv()
+if _dotenv_path:
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path)
+
+# Valores inválidos encontrados na leitura (reportados todos juntos por `validate`)
+_invalid = []
+
+
+def _number(cast, name: str, default):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        _invalid.append(f"{name}={value!r} não é um número válido")
+        return default
+
+
+def _int(name: str, default: int):
+    return _number(int, name, default)
+
+
+def _float(name: str, default: float):
+    return _number(float, name, float(default))
+
+
+def _bool(name: str, default: bool):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+# Configuração das APIs (obrigatória). Lida sob demanda por `get_upstreams`, para que a
+# importação nunca falhe e todas as ausências sejam reportadas juntas no startup
+REQUIRED_SETTINGS = {
+    "AC_API_URL": "URL da conta do ActiveCampaign",
+    "AC_API_KEY": "token da API do ActiveCampaign",
+    "PIPEDRIVE_API_URL": "URL base da API do Pipedrive (ex.: https://suaempresa.pipedrive.com/api/v1)",
+    "PIPEDRIVE_API_KEY": "token da API do Pipedrive",
+}
 
-PIPEDRIVE_API_URL = os.getenv("PIPEDRIVE_API_URL") + "/persons"
-PIPEDRIVE_API_KEY = os.getenv("PIPEDRIVE_API_KEY")
-PIPEDRIVE_API_URL_deal = 'https://suaempresa.pipedrive.com/api/v1/deals'
+AC_LIST_ID = os.getenv("AC_LIST_ID")
 
 PIPELINE_STAGE_ID = 1
 
-# Mapeamento de listas para funis
-LIST_TO_PIPELINE = {
-    "61": {"pipeline_id": 3, "stage_id": 33},  # Lista 61 → Funil Pós IA (estágio: Lead Frio)
-    "70": {"pipeline_id": 2, "stage_id": 34}   # Lista 70 → Funil Escola IA (estágio: Lead Frio)
+
+class ConfigurationError(RuntimeError):
+    """Configuração ausente ou inválida (com todos os problemas encontrados)."""
+
+    def __init__(self, problems: list):
+        super().__init__("Configuração inválida: " + "; ".join(problems))
+        self.problems = problems
+
+
+@dataclass(frozen=True)
+class UpstreamSettings:
+    """Credenciais e URLs do ActiveCampaign e do Pipedrive (todas derivadas das URLs base)."""
+    ac_api_url: str
+    ac_api_key: str
+    pipedrive_api_url: str
+    pipedrive_api_key: str
+
+    @property
+    def ac_contacts_url(self):
+        return f"{self.ac_api_url}/api/3/contacts"
+
+    @property
+    def pipedrive_persons_url(self):
+        return f"{self.pipedrive_api_url}/persons"
+
+    @property
+    def pipedrive_persons_search_url(self):
+        return f"{self.pipedrive_api_url}/persons/search"
+
+    @property
+    def pipedrive_deals_url(self):
+        return f"{self.pipedrive_api_url}/deals"
+
+    @property
+    def pipedrive_stages_url(self):
+        return f"{self.pipedrive_api_url}/stages"
+
+    @property
+    def pipedrive_person_fields_url(self):
+        return f"{self.pipedrive_api_url}/personFields"
+
+    @property
+    def pipedrive_deal_fields_url(self):
+        return f"{self.pipedrive_api_url}/dealFields"
+
+
+def configuration_problems():
+    """Todas as variáveis obrigatórias ausentes e os valores inválidos."""
+    problems = [
+        f"{name} não definida ({description})"
+        for name, description in REQUIRED_SETTINGS.items()
+        if not os.getenv(name)
+    ]
+    return problems + _invalid
+
+
+@functools.lru_cache(maxsize=None)
+def get_upstreams():
+    """
+    Configuração dos upstreams, validada no primeiro uso e reaproveitada depois.
+    Levanta ConfigurationError com todos os problemas se algo estiver faltando.
+    """
+    problems = configuration_problems()
+    if problems:
+        raise ConfigurationError(problems)
+    return UpstreamSettings(
+        ac_api_url=os.getenv("AC_API_URL").rstrip("/"),
+        ac_api_key=os.getenv("AC_API_KEY"),
+        pipedrive_api_url=os.getenv("PIPEDRIVE_API_URL").rstrip("/"),
+        pipedrive_api_key=os.getenv("PIPEDRIVE_API_KEY")
+    )
+
+
+def validate():
+    """Confere toda a configuração de uma vez (chamado no startup)."""
+    get_upstreams()
+
+# Tabela de roteamento dos webhooks (funil → pipeline/estágio e listas do ActiveCampaign)
+WEBHOOK_ROUTING_PATH = os.getenv("WEBHOOK_ROUTING_PATH", os.path.join(os.path.dirname(__file__), "routing.json"))
+# Intervalo mínimo entre verificações de alteração do arquivo (recarga a quente); 0 desliga
+WEBHOOK_ROUTING_RELOAD_SECONDS = _float("WEBHOOK_ROUTING_RELOAD_SECONDS", 5)
+
+# Campos personalizados por nome lógico. As chaves/ids reais são resolvidos no startup pelo
+# registro de schema (services/schema.py) a partir das definições de campos de cada sistema:
+# primeiro pela chave esperada (UTM_FIELDS/CUSTOM_FIELDS/DEAL_CUSTOM_FIELDS), depois pelo título abaixo.
+# As chaves esperadas também são usadas enquanto as definições não puderem ser carregadas.
+FIELD_TITLES = {
+    "utm_campaign": "UTM Campaign",
+    "utm_source": "UTM Source",
+    "utm_medium": "UTM Medium",
+    "utm_content": "UTM Content",
+    "utm_term": "UTM Term",
+    "email_personalizado": "Email personalizado",
+    "telefone_personalizado": "Telefone personalizado",
 }
 
+# Ids esperados dos campos no ActiveCampaign
 UTM_FIELDS = {
     "utm_campaign": "16",
     "utm_medium": "18",
@@ -27,6 +169,7 @@ UTM_FIELDS = {
     "utm_source": "17",
 }
 
+# Chaves esperadas dos campos de pessoa no Pipedrive
 CUSTOM_FIELDS = {
     "utm_campaign": "0722ce86e5e4d808c95f3c164aff5d396761222d",
     "utm_source": "98b877f5c8ed5d7a0e6aae18b9dfb290380181ea",
@@ -35,3 +178,115 @@ CUSTOM_FIELDS = {
     "email_personalizado": "cbcda7fdd568ebeb951bf22f08196489546cd038",
     "telefone_personalizado": "25b40c8ab005c52701d02831eafe90429b2f139a",
 }
+
+# Chaves esperadas dos campos de negócio no Pipedrive (as de pessoa não valem para negócios).
+# Vazio: os campos são resolvidos só pelo título
+DEAL_CUSTOM_FIELDS = {}
+
+# Clientes HTTP (um pool keep-alive por upstream)
+HTTP_TIMEOUT_SECONDS = _float("HTTP_TIMEOUT_SECONDS", 30)
+HTTP_MAX_CONNECTIONS = _int("HTTP_MAX_CONNECTIONS", 50)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = _int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+# Timeouts por upstream e de conexão. Pipedrive e ActiveCampaign usam HTTP_TIMEOUT_SECONDS se não configurados;
+# o Data Lake tem um limite menor porque os lotes não enviados ficam no spool local
+HTTP_CONNECT_TIMEOUT_SECONDS = _float("HTTP_CONNECT_TIMEOUT_SECONDS", 5)
+PIPEDRIVE_TIMEOUT_SECONDS = _float("PIPEDRIVE_TIMEOUT_SECONDS", HTTP_TIMEOUT_SECONDS)
+ACTIVECAMPAIGN_TIMEOUT_SECONDS = _float("ACTIVECAMPAIGN_TIMEOUT_SECONDS", HTTP_TIMEOUT_SECONDS)
+DATALAKE_TIMEOUT_SECONDS = _float("DATALAKE_TIMEOUT_SECONDS", 10)
+
+# Circuit breaker por upstream: falhas seguidas (timeout, conexão, 5xx) que abrem o circuito
+# e por quanto tempo as chamadas falham na hora antes de uma nova tentativa
+CIRCUIT_FAILURE_THRESHOLD = _int("CIRCUIT_FAILURE_THRESHOLD", 5)
+CIRCUIT_RESET_SECONDS = _float("CIRCUIT_RESET_SECONDS", 30)
+
+# Sincronização de listas: quantos contatos são processados em paralelo
+SYNC_CONCURRENCY = _int("SYNC_CONCURRENCY", 10)
+# Tamanho do lote (pessoas do lote primeiro, depois os negócios); 0 processa contato a contato
+SYNC_BATCH_SIZE = _int("SYNC_BATCH_SIZE", 0)
+
+# Paginação da API de contatos do ActiveCampaign (máximo aceito pela API: 100)
+AC_PAGE_SIZE = _int("AC_PAGE_SIZE", 100)
+
+# Cache das definições de campos personalizados do ActiveCampaign (id ↔ título)
+AC_FIELD_CACHE_TTL = _int("AC_FIELD_CACHE_TTL", 3600)
+
+# Cache dos estágios dos funis do Pipedrive
+PIPEDRIVE_STAGE_CACHE_TTL = _int("PIPEDRIVE_STAGE_CACHE_TTL", 3600)
+
+# Carga dos caches no startup (definições de campos e estágios dos funis): "blocking" espera a carga
+# antes de aceitar requisições; "background" aceita logo (cold start mais rápido) e carrega em paralelo.
+# Com SCHEMA_STRICT a carga é sempre "blocking"
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "blocking")
+
+# Registro de schema (definições de campos do Pipedrive e do ActiveCampaign): intervalo de recarga
+SCHEMA_CACHE_TTL = _int("SCHEMA_CACHE_TTL", 3600)
+# Com SCHEMA_STRICT=true, campos configurados que não existem nos sistemas impedem o startup
+SCHEMA_STRICT = _bool("SCHEMA_STRICT", False)
+
+# Diretório dos arquivos de estado local (fila de ingestão, índices, cursores)
+STATE_DIR = os.getenv("STATE_DIR", "data")
+
+# Estado compartilhado (caches, orçamento do rate limit, resultados recentes de leads):
+# "memory" vale para um único processo; "sqlite" é compartilhado pelos workers do mesmo host
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", os.path.join(STATE_DIR, "shared_state.sqlite3"))
+
+# Ingestão dos webhooks: "sync" cria no Pipedrive durante a requisição,
+# "queue" grava o lead numa fila local durável, responde 202 e processa em background
+WEBHOOK_INGEST_MODE = os.getenv("WEBHOOK_INGEST_MODE", "sync")
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", os.path.join(STATE_DIR, "ingest_queue.sqlite3"))
+INGEST_WORKERS = _int("INGEST_WORKERS", 4)
+INGEST_MAX_ATTEMPTS = _int("INGEST_MAX_ATTEMPTS", 5)
+INGEST_RETRY_BASE_SECONDS = _float("INGEST_RETRY_BASE_SECONDS", 5)
+# Lease de um item em processamento: renovado enquanto o worker vive; vencido, o item volta para a fila
+INGEST_LEASE_SECONDS = _float("INGEST_LEASE_SECONDS", 300)
+
+# Entregas repetidas do mesmo lead (email, funil) esperam a criação em andamento;
+# o resultado fica em memória por este tempo para absorver as que chegam depois. 0 desliga o cache
+LEAD_SINGLEFLIGHT_TTL_SECONDS = _float("LEAD_SINGLEFLIGHT_TTL_SECONDS", 30)
+
+# Índice local de deduplicação (email/telefone → pessoa no Pipedrive)
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join(STATE_DIR, "dedup_index.sqlite3"))
+# Em caso de miss no índice, consulta a busca de pessoas do Pipedrive antes de criar
+DEDUP_REMOTE_LOOKUP = _bool("DEDUP_REMOTE_LOOKUP", False)
+
+# Agendador de requisições do Pipedrive (token bucket + backoff em 429)
+PIPEDRIVE_RATE_LIMIT = _int("PIPEDRIVE_RATE_LIMIT", 80)                # requisições por janela
+PIPEDRIVE_RATE_WINDOW_SECONDS = _float("PIPEDRIVE_RATE_WINDOW_SECONDS", 2)
+PIPEDRIVE_BULK_RESERVE = _float("PIPEDRIVE_BULK_RESERVE", 0.25)         # fração reservada aos webhooks
+PIPEDRIVE_MAX_RETRIES = _int("PIPEDRIVE_MAX_RETRIES", 5)
+PIPEDRIVE_BACKOFF_BASE_SECONDS = _float("PIPEDRIVE_BACKOFF_BASE_SECONDS", 1)
+
+# Envio em lote dos eventos do webhook contactAC para o Data Lake (NDJSON gzip)
+DATALAKE_BATCH_MAX_EVENTS = _int("DATALAKE_BATCH_MAX_EVENTS", 500)
+DATALAKE_BATCH_MAX_BYTES = _int("DATALAKE_BATCH_MAX_BYTES", 5 * 1024 * 1024)
+DATALAKE_BATCH_MAX_SECONDS = _float("DATALAKE_BATCH_MAX_SECONDS", 30)
+# Lotes que não puderam ser enviados ficam aqui até o próximo envio
+DATALAKE_SPOOL_DIR = os.getenv("DATALAKE_SPOOL_DIR", os.path.join(STATE_DIR, "datalake_spool"))
+# Cópia local de cada lote enviado ao Data Lake, lida pela reconciliação (vazio desliga) e por quantos dias é mantida
+DATALAKE_ARCHIVE_DIR = os.getenv("DATALAKE_ARCHIVE_DIR", os.path.join(STATE_DIR, "datalake_archive"))
+DATALAKE_ARCHIVE_RETENTION_DAYS = _float("DATALAKE_ARCHIVE_RETENTION_DAYS", 14)
+
+# Reconciliação com o arquivo do Data Lake: leads reenviados em paralelo
+RECONCILE_CONCURRENCY = _int("RECONCILE_CONCURRENCY", 10)
+
+# Cursores (high-water mark) da sincronização incremental por lista/funil
+SYNC_CURSOR_PATH = os.getenv("SYNC_CURSOR_PATH", os.path.join(STATE_DIR, "sync_cursors.sqlite3"))
+
+# Jobs em background (sincronizações e importações) e seu progresso
+JOBS_PATH = os.getenv("JOBS_PATH", os.path.join(STATE_DIR, "jobs.sqlite3"))
+# Job "running" sem progresso há este tempo é considerado parado (worker caiu) e é retomado
+JOB_STALE_SECONDS = _float("JOB_STALE_SECONDS", 300)
+# Intervalo da verificação de jobs parados ou interrompidos
+JOB_WATCHDOG_SECONDS = _float("JOB_WATCHDOG_SECONDS", 60)
+# Importação de leads por arquivo: onde o upload é gravado e quantas linhas cada lote processa
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(STATE_DIR, "imports"))
+IMPORT_BATCH_SIZE = _int("IMPORT_BATCH_SIZE", 500)
+
+# Logs estruturados (uma linha JSON por evento, escrita por uma thread dedicada)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")                                   # "json" ou "text"
+# Fração das requisições cujo payload é registrado (em DEBUG); 0 desliga
+LOG_PAYLOAD_SAMPLE_RATE = _float("LOG_PAYLOAD_SAMPLE_RATE", 0)
+# Mascara email, telefone e nome nos payloads registrados
+LOG_REDACT_PII = _bool("LOG_REDACT_PII", True)
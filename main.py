@@ -1,278 +1,291 @@
-from fastapi import FastAPI, HTTPException, Form, Request
-from services import activecampaign, pipedrive
-from config.settings import LIST_TO_PIPELINE
+import asyncio
+import datetime
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from services import activecampaign, http_client, sync, stages, leads, ratelimit, metrics, webhooks, bulk_import, reconcile
+from services.ingest_queue import ingest_queue
+from services.dedup import dedup_index
+from services.sync_cursors import sync_cursors
+from services.shared_state import shared_state
+from services.jobs import job_store
+from services.routing import routing_table
+from services.schema import schema_registry
+from services.circuit_breaker import CircuitOpenError
+from config import settings
+from config.settings import SYNC_BATCH_SIZE, STARTUP_WARM_UP, SCHEMA_STRICT, ConfigurationError
 import json
-from services.ActiveCampaign.contactACService import router as activecampaign_router
+from services.ActiveCampaign.contactACService import router as activecampaign_router, datalake_buffer
+from config.logging_config import setup_logging
 
+# Logs estruturados e não bloqueantes para toda a aplicação
+setup_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Toda a configuração é conferida de uma vez: o startup falha listando tudo o que falta
+    try:
+        settings.validate()
+    except ConfigurationError as e:
+        for problem in e.problems:
+            logger.error("Configuração — %s", problem)
+        raise
+    logger.info("Estado compartilhado: %s", shared_state.name)
+    # Tabela de roteamento dos webhooks (falha no startup se o arquivo for inválido)
+    routing_table.load()
+    # Resolve as chaves dos campos personalizados e carrega os estágios dos funis, em paralelo,
+    # conferindo os campos e estágios configurados. Os pools HTTP são criados no primeiro uso
+    warm_up = asyncio.gather(schema_registry.start(), stages.warm_up(routing_table.pipelines()))
+    if STARTUP_WARM_UP == "background" and not SCHEMA_STRICT:
+        logger.info("Carga dos caches em background")
+    else:
+        await warm_up
+    # Workers da fila de ingestão (também drenam itens pendentes de execuções anteriores)
+    await ingest_queue.start(leads.process_queued_lead)
+    # Flush periódico dos eventos do webhook contactAC para o Data Lake
+    await datalake_buffer.start()
+    # Retoma jobs interrompidos e vigia jobs parados (ex.: worker que caiu)
+    await job_store.start()
+    yield
+    warm_up.cancel()
+    await job_store.stop()
+    await datalake_buffer.stop()
+    await ingest_queue.stop()
+    await schema_registry.stop()
+    dedup_index.close()
+    sync_cursors.close()
+    shared_state.close()
+    await http_client.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(activecampaign_router)
+app.include_router(webhooks.router)
 
 
-@app.get("/contacts/{list_id}")
-def get_activecampaign_contacts(list_id: int):
-    return activecampaign.get_contacts_by_list(list_id)
-
-@app.post("/sync_contacts/{list_id}/{pipeline_id}")
-def sync_contacts(list_id: int, pipeline_id: int):
-    contacts_response = activecampaign.get_contacts_by_list(list_id)
-    
-    if "error" in contacts_response:
-        return contacts_response
-        
-    contacts = contacts_response.get("contacts", [])
-    if not contacts:
-        return {"message": "Nenhum contato novo encontrado."}
-
-    results = []
-
-    for contact in contacts:
-        person_id, error = pipedrive.create_person(contact)
-        
-        if error:
-            results.append({"email": contact["email"], "error": error})
-            continue
-
-        if person_id:
-            deal_response = pipedrive.create_deal(
-                person_id, 
-                contact["utm_campaign"], 
-                contact["utm_source"], 
-                pipeline_id
-            )
-            results.append({
-                "email": contact["email"], 
-                "person_id": person_id, 
-                "deal": deal_response
-            })
-
-    return {"message": "Sincronização concluída", "results": results}
-
-@app.post("/webhook/activecampaign")
-async def activecampaign_webhook(
-    request: Request,
-    url: str = Form(None),
-    type: str = Form(None),
-    date_time: str = Form(None),
-    initiated_by: str = Form(None),
-    initiated_from: str = Form(None),
-    list: str = Form(None),
-    contact_email: str = Form(None),
-    contact_phone: str = Form(None),
-    contact_first_name: str = Form(None),
-    contact_last_name: str = Form(None),
-    contact_utm_campaign: str = Form(None),
-    contact_utm_source: str = Form(None),
-    contact_utm_medium: str = Form(None),
-    contact_utm_content: str = Form(None)
-):
-    """
-    Webhook do ActiveCampaign que recebe leads e os cria no Pipedrive automaticamente.
-    Agora aceita JSON e application/x-www-form-urlencoded.
-    """
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latência de cada rota (pelo template do path, ex.: /contacts/{list_id})."""
+    start = time.perf_counter()
+    status = 500
     try:
-        # 🔍 Verificar se os dados vieram como JSON ou como Form URL Encoded
-        payload = {}
-        if request.headers.get("content-type") == "application/json":
-            payload = await request.json()
-        else:
-            # Construindo um dicionário dos dados recebidos via Form
-            payload = {
-                "contact": {
-                    "email": contact_email,
-                    "phone": contact_phone,
-                    "firstName": contact_first_name or "Desconhecido",
-                    "lastName": contact_last_name or "",
-                    "utm_campaign": contact_utm_campaign or "",
-                    "utm_source": contact_utm_source or "",
-                    "utm_medium": contact_utm_medium or "",
-                    "utm_content": contact_utm_content or "",
-                    "list_id": list
-                }
-            }
-
-        # 🔍 Debug: Ver o que está chegando
-        print(f"🔍 Payload Recebido: {json.dumps(payload, indent=4)}")
-
-        # Extrair informações do webhook
-        contact_data = payload.get("contact", {})
-        list_id = str(contact_data.get("list_id"))
-
-        print(f"📌 List ID Recebido: {list_id}")  # Debug para ver se está pegando certo
-
-        if not list_id or list_id not in LIST_TO_PIPELINE:
-            return {"error": "Lista não configurada para sincronização."}
-
-        # Preparar dados do contato
-        contact_info = {
-            "email": contact_data.get("email", ""),
-            "phone": contact_data.get("phone", ""),
-            "first_name": contact_data.get("firstName", "Desconhecido"),
-            "last_name": contact_data.get("lastName", ""),
-            "utm_campaign": contact_data.get("utm_campaign", ""),
-            "utm_source": contact_data.get("utm_source", ""),
-            "utm_medium": contact_data.get("utm_medium", ""),
-            "utm_content": contact_data.get("utm_content", "")
-        }
-
-        # Criar contato no Pipedrive
-        person_id = pipedrive.create_contact_with_custom_fields(contact_info)
-
-        # Criar deal no pipeline correto
-        pipeline_info = LIST_TO_PIPELINE[list_id]
-        deal_title = f"Negócio com {contact_info['utm_campaign'] if contact_info['utm_campaign'] else 'Lead'}"
-
-        pipedrive.create_deal_with_pipeline(
-            person_id=person_id,
-            pipeline_info=pipeline_info,
-            title=deal_title
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
         )
 
-        return {"message": "Contato e negócio criados com sucesso!", "contact_id": person_id}
 
-    except Exception as e:
-        print(f"❌ Erro no Webhook: {str(e)}")  # Debug
-        raise HTTPException(status_code=500, detail=str(e))
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Upstream com circuito aberto: 503 imediato em vez de esperar o timeout."""
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(exc), "upstream": exc.upstream},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)}
+    )
 
 
+@app.get("/health")
+async def health():
+    """Estado dos circuit breakers dos upstreams; `degraded` se algum circuito não estiver fechado."""
+    upstreams = {name: breaker.snapshot() for name, breaker in http_client.breakers.items()}
+    healthy = all(upstream["state"] == "closed" for upstream in upstreams.values())
+    return {
+        "status": "ok" if healthy else "degraded",
+        "upstreams": upstreams,
+        "ingest_queue": await ingest_queue.stats()
+    }
 
-# 🔹 Criamos dois webhooks específicos para cada lista do ActiveCampaign
-@app.post("/webhook/pos_ia")
-async def webhook_pos_ia(
-    request: Request,
-    url: str = Form(None),
-    type: str = Form(None),
-    date_time: str = Form(None),
-    initiated_by: str = Form(None),
-    initiated_from: str = Form(None),
-    contact_email: str = Form(None),
-    contact_phone: str = Form(None),
-    contact_first_name: str = Form(None),
-    contact_last_name: str = Form(None),
-    contact_utm_campaign: str = Form(None),
-    contact_utm_source: str = Form(None),
-    contact_utm_medium: str = Form(None),
-    contact_utm_content: str = Form(None)
-):
-    """Webhook para leads da lista Pós IA."""
-    return await process_webhook(
-        request=request,
-        contact_email=contact_email,
-        contact_phone=contact_phone,
-        contact_first_name=contact_first_name,
-        contact_last_name=contact_last_name,
-        contact_utm_campaign=contact_utm_campaign,
-        contact_utm_source=contact_utm_source,
-        contact_utm_medium=contact_utm_medium,
-        contact_utm_content=contact_utm_content,
-        pipeline_id=3,  # Funil Pós IA
-        stage_id=33  # Estágio: Lead Frio
-    )
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métricas no formato texto do Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-@app.post("/webhook/escola_ia")
-async def webhook_escola_ia(
-    request: Request,
-    url: str = Form(None),
-    type: str = Form(None),
-    date_time: str = Form(None),
-    initiated_by: str = Form(None),
-    initiated_from: str = Form(None),
-    contact_email: str = Form(None),
-    contact_phone: str = Form(None),
-    contact_first_name: str = Form(None),
-    contact_last_name: str = Form(None),
-    contact_utm_campaign: str = Form(None),
-    contact_utm_source: str = Form(None),
-    contact_utm_medium: str = Form(None),
-    contact_utm_content: str = Form(None)
+
+@app.get("/contacts/{list_id}")
+async def get_activecampaign_contacts(list_id: int, page_size: Optional[int] = None):
+    """Retorna os contatos da lista em NDJSON (um contato por linha), página a página."""
+    async def ndjson():
+        try:
+            async for contact in activecampaign.iter_contacts_by_list(list_id, page_size):
+                yield json.dumps(contact.to_dict(), ensure_ascii=False) + "\n"
+        except activecampaign.ActiveCampaignError as e:
+            yield json.dumps(e.to_dict(), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/sync_contacts/{list_id}/{pipeline_id}", status_code=202)
+async def sync_contacts(
+    list_id: int,
+    pipeline_id: int,
+    concurrency: Optional[int] = None,
+    page_size: Optional[int] = None,
+    mode: Literal["full", "incremental"] = "full",
+    batch_size: Optional[int] = None
 ):
-    """Webhook para leads da lista Escola IA."""
-    return await process_webhook(
-        request=request,
-        contact_email=contact_email,
-        contact_phone=contact_phone,
-        contact_first_name=contact_first_name,
-        contact_last_name=contact_last_name,
-        contact_utm_campaign=contact_utm_campaign,
-        contact_utm_source=contact_utm_source,
-        contact_utm_medium=contact_utm_medium,
-        contact_utm_content=contact_utm_content,
-        pipeline_id=2,  # Funil Escola IA
-        stage_id=34  # Estágio: Lead Frio
-    )
+    """
+    Sincroniza a lista com o funil em background. `mode=incremental` processa só os contatos
+    criados/alterados depois da última sincronização incremental bem-sucedida.
+    Com `batch_size` (padrão: SYNC_BATCH_SIZE), cada lote cria primeiro as pessoas e depois os negócios.
+    O progresso fica em GET /jobs/{job_id}; um job interrompido é retomado da última página concluída.
+    """
+    batch_size = SYNC_BATCH_SIZE if batch_size is None else batch_size
+    job_id = await sync.start_sync_job(list_id, pipeline_id, mode, concurrency, page_size, batch_size)
+    return {"message": "Sincronização iniciada.", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
 
-# 🔹 Função genérica para processar os dados recebidos
-async def process_webhook(
+@app.post("/import_contacts/{pipeline_id}", status_code=202)
+async def import_contacts(
     request: Request,
-    contact_email: str,
-    contact_phone: str,
-    contact_first_name: str,
-    contact_last_name: str,
-    contact_utm_campaign: str,
-    contact_utm_source: str,
-    contact_utm_medium: str,
-    contact_utm_content: str,
     pipeline_id: int,
-    stage_id: int
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None
 ):
     """
-    Processa o webhook recebido e cria o contato e o negócio no Pipedrive.
+    Importa um arquivo CSV (com cabeçalho) ou NDJSON de leads para o funil, sem passar pelo ActiveCampaign.
+    O corpo é o próprio arquivo (ex.: curl --data-binary @leads.csv -H "Content-Type: text/csv");
+    ele é gravado em disco conforme chega e processado em lotes em background.
+    Colunas: email, phone, first_name, last_name, utm_campaign, utm_source, utm_medium, utm_content.
+    O progresso fica em GET /jobs/{job_id}.
     """
-    try:
-        # 🔍 Debug: Ver o que está chegando
-        payload = {}
-        if request.headers.get("content-type") == "application/json":
-            payload = await request.json()
-        else:
-            payload = {
-                "contact": {
-                    "email": contact_email,
-                    "phone": contact_phone,
-                    "firstName": contact_first_name or "Desconhecido",
-                    "lastName": contact_last_name or "",
-                    "utm_campaign": contact_utm_campaign or "",
-                    "utm_source": contact_utm_source or "",
-                    "utm_medium": contact_utm_medium or "",
-                    "utm_content": contact_utm_content or "",
-                }
-            }
-
-        print(f"🔍 Payload Recebido: {json.dumps(payload, indent=4)}")
-
-        # Extrair informações do contato
-        contact_data = payload.get("contact", {})
-
-        contact_info = {
-            "email": contact_data.get("email", ""),
-            "phone": contact_data.get("phone", ""),
-            "first_name": contact_data.get("firstName", "Desconhecido"),
-            "last_name": contact_data.get("lastName", ""),
-            "utm_campaign": contact_data.get("utm_campaign", ""),
-            "utm_source": contact_data.get("utm_source", ""),
-            "utm_medium": contact_data.get("utm_medium", ""),
-            "utm_content": contact_data.get("utm_content", "")
-        }
-
-        # Criar contato no Pipedrive
-        person_id = pipedrive.create_contact_with_custom_fields(contact_info)
-
-        # Criar dicionário correto para o pipeline
-        pipeline_info = {
-            "pipeline_id": pipeline_id,
-            "stage_id": stage_id
-        }
-
-        # Criar deal no funil correto
-        deal_title = f"Negócio com {contact_info['utm_campaign'] if contact_info['utm_campaign'] else 'Lead'}"
-        pipedrive.create_deal_with_pipeline(
-            person_id=person_id,
-            pipeline_info=pipeline_info,  # ✅ Passando o dicionário corretamente
-            title=deal_title
+    file_format = bulk_import.detect_format(request.headers.get("content-type"), format)
+    if file_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Envie text/csv ou application/x-ndjson (ou informe ?format=csv|ndjson)."
         )
 
-        return {"message": "Contato e negócio criados com sucesso!", "contact_id": person_id}
+    job_id = await bulk_import.start_import(request.stream(), file_format, pipeline_id, concurrency, batch_size)
+    return {"message": "Importação iniciada.", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 20):
+    """Jobs mais recentes."""
+    return await job_store.list(limit)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status e progresso de um job (processados, falhas, restantes e vazão)."""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str):
+    """Retoma do último checkpoint um job falho ou interrompido."""
+    if await job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if not await job_store.resume(job_id):
+        raise HTTPException(status_code=409, detail="O job está em andamento ou já foi concluído.")
+    return {"message": "Job retomado.", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+@app.get("/admin/stages")
+async def get_stage_registry():
+    """Estado do registro de estágios do Pipedrive."""
+    return stages.stage_registry.snapshot()
+
+@app.post("/admin/stages/refresh")
+async def refresh_stage_registry():
+    """Recarrega os estágios do Pipedrive imediatamente."""
+    await stages.stage_registry.refresh()
+    return stages.stage_registry.snapshot()
+
+@app.get("/admin/schema")
+async def get_schema_registry():
+    """Chaves resolvidas dos campos personalizados e divergências com a configuração."""
+    return schema_registry.snapshot()
+
+@app.post("/admin/schema/refresh")
+async def refresh_schema_registry():
+    """Recarrega as definições de campos do Pipedrive e do ActiveCampaign imediatamente."""
+    await schema_registry.refresh()
+    schema_registry.report()
+    return schema_registry.snapshot()
+
+@app.post("/admin/reconcile")
+async def reconcile_archive(
+    since: datetime.datetime,
+    until: Optional[datetime.datetime] = None,
+    funnel: Optional[str] = None,
+    dry_run: bool = True,
+    concurrency: Optional[int] = None,
+    limit: int = 100
+):
+    """
+    Reconciliação com o arquivo do Data Lake: lê os eventos do contactAC recebidos entre `since`
+    e `until` (padrão: agora), confere cada lead no índice de deduplicação e, sem `dry_run`,
+    recria em background só as pessoas/negócios que faltam (progresso em GET /jobs/{job_id}).
+    O funil vem da lista do evento, ou de `funnel` para todos os eventos da janela.
+    Com `dry_run` (padrão), devolve o diff sem criar nada.
+    """
+    until = until or datetime.datetime.now(datetime.timezone.utc)
+    if funnel and routing_table.for_funnel(funnel) is None:
+        raise HTTPException(status_code=404, detail=f"Funil '{funnel}' não configurado.")
+
+    if not dry_run:
+        job_id = await reconcile.start_reconcile_job(since, until, funnel, concurrency)
+        return JSONResponse(
+            status_code=202,
+            content={"message": "Reconciliação iniciada.", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
+        )
 
-    except Exception as e:
-        print(f"❌ Erro no Webhook: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    report, missing = await reconcile.diff(since, until, funnel, concurrency)
+    return {**report, "missing": reconcile.describe(missing, limit)}
+
+@app.get("/admin/queue")
+async def get_ingest_queue():
+    """Tamanho da fila de ingestão e das dead letters."""
+    return await ingest_queue.stats()
+
+@app.get("/admin/queue/dead_letters")
+async def get_dead_letters(limit: int = 100):
+    return await ingest_queue.dead_letters(limit)
+
+@app.post("/admin/queue/dead_letters/{item_id}/requeue")
+async def requeue_dead_letter(item_id: int):
+    if not await ingest_queue.requeue_dead_letter(item_id):
+        raise HTTPException(status_code=404, detail="Item não encontrado nas dead letters.")
+    return {"message": "Item devolvido para a fila.", "id": item_id}
+
+@app.get("/admin/ratelimit")
+async def get_rate_limit():
+    """Estado do token bucket das chamadas ao Pipedrive."""
+    return await ratelimit.pipedrive_scheduler.snapshot()
+
+@app.get("/admin/dedup")
+async def get_dedup_index():
+    """Quantidade de chaves e negócios no índice de deduplicação e criações em andamento."""
+    return {**await dedup_index.stats(), "singleflight": await leads.lead_flights.stats()}
+
+@app.post("/admin/dedup/backfill")
+async def backfill_dedup_index():
+    """Preenche o índice de deduplicação com as pessoas já existentes no Pipedrive."""
+    indexed = await dedup_index.backfill()
+    return {"message": "Índice preenchido.", "persons": indexed}
+
+@app.get("/admin/routing")
+async def get_routing_table():
+    """Tabela de roteamento dos webhooks em uso."""
+    return routing_table.snapshot()
+
+@app.post("/admin/routing/reload")
+async def reload_routing_table():
+    """Relê config/routing.json; se o arquivo for inválido, a tabela atual é mantida."""
+    if not routing_table.reload():
+        raise HTTPException(status_code=422, detail="Tabela de roteamento inválida; a versão anterior foi mantida.")
+    await stages.warm_up(routing_table.pipelines())
+    return routing_table.snapshot()
@@ -1,28 +1,22 @@
 from fastapi import APIRouter, Request, UploadFile, File, HTTPException
 import logging
 import urllib.parse
-import json
 from io import BytesIO
 import datetime
-import requests
-import os
+import httpx
 from typing import Optional
+from services import http_client
+from services.circuit_breaker import CircuitOpenError
+from config.logging_config import log_payload
+from config.settings import get_upstreams, ConfigurationError
+from services.ActiveCampaign.fieldCache import field_cache
+from services.schema import schema_registry
+from services.ActiveCampaign.datalakeBuffer import DatalakeBuffer
+from services.ActiveCampaign.datalakeArchive import datalake_archive
 
 
 router = APIRouter()
-
-# ActiveCampaign API configuration
-AC_API_URL = os.getenv("AC_API_URL")
-AC_API_KEY = os.getenv("AC_API_KEY")
-
-# Define UTM custom field names to look for
-UTM_FIELDS = [
-    'UTM Campaign',
-    'UTM Medium',
-    'UTM Content',
-    'UTM Source',
-    'UTM Term'
-]
+logger = logging.getLogger(__name__)
 
 @router.post("/api/webhook/contactAC")
 async def webhook(request: Request):
@@ -31,25 +25,23 @@ async def webhook(request: Request):
         body_str = body.decode("utf-8")  # Converte para string
 
         parsed_data = urllib.parse.parse_qs(body_str)
-        logging.info(f"Data recebida: {parsed_data}")
+        log_payload(logger, "Data recebida", parsed_data)
         
         if not body:
-            logging.warning("Corpo da requisição está vazio.")
+            logger.warning("Corpo da requisição está vazio.")
             return {"status": "error", "message": "Corpo da requisição vazio."}
         
         # Processa os dados
         json_data = parse_webhookdata_json(body_str)
+        json_data["received_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
 
-        # Cria JSON na memória
-        filename, json_file = create_json_in_memory(json_data)
+        # Adiciona ao lote em memória; o envio ao Data Lake acontece em background
+        datalake_buffer.add(json_data)
 
-        # Envia para o Data Lake
-        response = send_to_datalake(filename, json_file)
-
-        return {"status": "success", "received_body": response}
+        return {"status": "success", "buffered": True}
 
     except Exception as e:
-        logging.error(f"Erro inesperado ao processar webhook: {e}")
+        logger.error("Erro inesperado ao processar webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 
@@ -62,14 +54,16 @@ async def get_contact_with_utm_fields(contact_id: str):
     :return: Contact details with UTM custom fields
     """
     try:
-        if not AC_API_KEY:
-            raise HTTPException(status_code=500, detail="ActiveCampaign API key not configured")
+        try:
+            upstreams = get_upstreams()
+        except ConfigurationError as e:
+            raise HTTPException(status_code=500, detail=f"ActiveCampaign API not configured: {e}")
         
-        headers = {"Api-Token": AC_API_KEY}
+        headers = {"Api-Token": upstreams.ac_api_key}
         
         # Get basic contact data
-        contact_url = f"{AC_API_URL}/api/3/contacts/{contact_id}"
-        contact_response = requests.get(contact_url, headers=headers)
+        contact_url = f"{upstreams.ac_api_url}/api/3/contacts/{contact_id}"
+        contact_response = await http_client.request(http_client.ACTIVECAMPAIGN, "GET", contact_url, headers=headers)
         contact_response.raise_for_status()
         
         contact_data = contact_response.json().get('contact')
@@ -80,8 +74,8 @@ async def get_contact_with_utm_fields(contact_id: str):
         #print(contact_data)
         
         # Get all field values for this contact
-        field_values_url = f"{AC_API_URL}/api/3/contacts/{contact_id}/fieldValues"
-        field_values_response = requests.get(field_values_url, headers=headers)
+        field_values_url = f"{upstreams.ac_api_url}/api/3/contacts/{contact_id}/fieldValues"
+        field_values_response = await http_client.request(http_client.ACTIVECAMPAIGN, "GET", field_values_url, headers=headers)
         field_values_response.raise_for_status()
         
         #apenas para saber quais dados ele me manda
@@ -94,28 +88,20 @@ async def get_contact_with_utm_fields(contact_id: str):
         utm_fields = {}
         all_custom_fields = {}
         
-        # For each field value, fetch field details to get the field name
+        # Resolve each field name from the cached field definitions (no request per field)
         for field_value in field_values:
-            field_url = field_value.get('links', {}).get('fieldValues')
-            
-            if field_url:
-                # Call the field URL to get field details
-                field_response = requests.get(field_url, headers=headers)
-                
-                if field_response.status_code == 200:
-                    field_data = field_response.json().get('field', {})
-                    field_title = field_data.get('title')
-                    
-                    if field_title:
-                        # Store field value
-                        field_value_text = field_value.get('value', '')
-                        
-                        # Add to UTM fields if it matches our list
-                        if field_title in UTM_FIELDS:
-                            utm_fields[field_title] = field_value_text
-                        
-                        # Add to all custom fields
-                        all_custom_fields[field_title] = field_value_text
+            field_title = await field_cache.get_title(field_value.get('field'))
+
+            if field_title:
+                # Store field value
+                field_value_text = field_value.get('value', '')
+
+                # Add to UTM fields if it is one of the UTM field ids resolved by the schema registry
+                if field_value.get('field') in schema_registry.activecampaign_ids:
+                    utm_fields[field_title] = field_value_text
+
+                # Add to all custom fields
+                all_custom_fields[field_title] = field_value_text
         
         # Create result with contact data and UTM fields
         result = {
@@ -126,12 +112,14 @@ async def get_contact_with_utm_fields(contact_id: str):
         
         return result
         
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching ActiveCampaign contact: {str(e)}")
-        status_code = e.response.status_code if hasattr(e, 'response') and e.response else 500
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except httpx.HTTPError as e:
+        logger.error("Error fetching ActiveCampaign contact: %s", str(e))
+        status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else 500
         raise HTTPException(status_code=status_code, detail=f"Failed to fetch contact details: {str(e)}")
     except Exception as e:
-        logging.error(f"Unexpected error when fetching contact: {str(e)}")
+        logger.error("Unexpected error when fetching contact: %s", str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
     
@@ -148,21 +136,9 @@ def parse_webhookdata_json(body_str: str):
     return cleaned_data
 
 
-def create_json_in_memory(data: dict):
+async def send_to_datalake(filename: str, file: BytesIO, content_type: str = "application/json"):
     """
-    Cria um JSON na memória e retorna um BytesIO com o conteúdo.
-    """
-    json_str = json.dumps(data, ensure_ascii=False, indent=4)
-    json_bytes = BytesIO(json_str.encode('utf-8'))  # Cria um BytesIO
-
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"contact_{timestamp}.json"
-
-    return filename, json_bytes  # Retorna nome e conteúdo em bytes
-
-def send_to_datalake(filename: str, file: BytesIO):
-    """
-    Envia um arquivo JSON para a API do Data Lake no formato multipart/form-data.
+    Envia um arquivo para a API do Data Lake no formato multipart/form-data.
     """
     url = "https://app-orion-dev.azurewebsites.net/api/azure-datalake/uploadfile"
     params = {
@@ -178,9 +154,14 @@ def send_to_datalake(filename: str, file: BytesIO):
     file.seek(0)
 
     files = {
-        "file": (filename, file.read(), "application/json")  # Corrige envio
+        "file": (filename, file.read(), content_type)  # Corrige envio
     }
 
-    response = requests.post(url, params=params, headers=headers, files=files)
+    response = await http_client.request(http_client.DATALAKE, "POST", url, params=params, headers=headers, files=files)
+
+    response.raise_for_status()
+    return response.json()
+
 
-    return response.json()
\ No newline at end of file
+# Lote em memória dos eventos do webhook (NDJSON gzip), com cópia local para a reconciliação
+datalake_buffer = DatalakeBuffer(send_to_datalake, archive=datalake_archive)
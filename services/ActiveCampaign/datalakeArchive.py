@@ -0,0 +1,111 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from config.settings import DATALAKE_ARCHIVE_DIR, DATALAKE_ARCHIVE_RETENTION_DAYS, DATALAKE_BATCH_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Nome gerado por datalakeBuffer.batch_filename: contacts_AAAAMMDD_HHMMSS_ffffff_<sufixo>.ndjson.gz
+BATCH_FILENAME = re.compile(r"^contacts_(\d{8}_\d{6}_\d{6})_[0-9a-f]+\.ndjson\.gz$")
+
+# Intervalo mínimo entre limpezas dos lotes vencidos
+PRUNE_INTERVAL = 3600
+
+
+def batch_timestamp(filename: str):
+    """Momento em que o lote foi fechado (UTC), pelo nome do arquivo; None se o nome não for de um lote."""
+    match = BATCH_FILENAME.match(filename)
+    if not match:
+        return None
+    return datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S_%f").replace(tzinfo=datetime.timezone.utc)
+
+
+def _received_at(event: dict):
+    try:
+        received_at = datetime.datetime.fromisoformat(event.get("received_at") or "")
+    except ValueError:
+        return None
+    return received_at if received_at.tzinfo else received_at.replace(tzinfo=datetime.timezone.utc)
+
+
+class LocalArchive:
+    """
+    Lotes NDJSON gzip dos eventos do webhook contactAC num diretório local: a cópia gravada
+    pelo DatalakeBuffer ou lotes baixados do Data Lake para o mesmo diretório.
+    Outra origem só precisa oferecer o mesmo `iter_events(since, until)`.
+    """
+
+    def __init__(
+        self,
+        directory: str = DATALAKE_ARCHIVE_DIR,
+        retention_days: float = DATALAKE_ARCHIVE_RETENTION_DAYS,
+        margin_seconds: float = DATALAKE_BATCH_MAX_SECONDS + 60
+    ):
+        self.directory = directory
+        self.retention_days = retention_days
+        # Um lote é fechado até `max_seconds` depois do seu primeiro evento
+        self.margin = datetime.timedelta(seconds=margin_seconds)
+        self._pruned_at = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def store(self, filename: str, content: bytes):
+        """Guarda uma cópia do lote (já comprimido) e remove os lotes vencidos de tempos em tempos."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        with open(path + ".tmp", "wb") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+
+        if self.retention_days and time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            self.prune()
+
+    def prune(self):
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.retention_days)
+        removed = 0
+        for filename in os.listdir(self.directory):
+            closed_at = batch_timestamp(filename)
+            if closed_at and closed_at < cutoff:
+                os.remove(os.path.join(self.directory, filename))
+                removed += 1
+        if removed:
+            logger.info("%s lotes antigos removidos do arquivo local do Data Lake", removed)
+
+    def batches(self, since: datetime.datetime, until: datetime.datetime):
+        """Arquivos dos lotes que podem conter eventos recebidos entre `since` e `until`, em ordem."""
+        if not os.path.isdir(self.directory):
+            return []
+        selected = []
+        for filename in os.listdir(self.directory):
+            closed_at = batch_timestamp(filename)
+            if closed_at and since <= closed_at <= until + self.margin:
+                selected.append(filename)
+        return sorted(selected)
+
+    def iter_events(self, since: datetime.datetime, until: datetime.datetime):
+        """Eventos recebidos entre `since` e `until`, lote a lote e linha a linha (sem carregar os lotes inteiros)."""
+        for filename in self.batches(since, until):
+            path = os.path.join(self.directory, filename)
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as file:
+                    for line in file:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            logger.warning("Linha inválida no lote %s", filename)
+                            continue
+                        received_at = _received_at(event)
+                        if received_at and since <= received_at <= until:
+                            yield event
+            except (OSError, EOFError) as e:
+                logger.error("Lote %s ilegível: %s", filename, e)
+
+
+datalake_archive = LocalArchive()
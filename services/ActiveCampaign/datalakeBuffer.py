@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from io import BytesIO
+from config.settings import (
+    DATALAKE_BATCH_MAX_EVENTS,
+    DATALAKE_BATCH_MAX_BYTES,
+    DATALAKE_BATCH_MAX_SECONDS,
+    DATALAKE_SPOOL_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+# Sufixo do lote do spool reivindicado por um processo durante o reenvio
+CLAIM_MARKER = ".sending."
+# Reivindicação mais antiga que isso é de um processo que parou: o lote volta para o spool
+STALE_CLAIM_SECONDS = 600
+
+
+def batch_filename():
+    """Nome único do lote: timestamp em microssegundos + sufixo aleatório."""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+    return f"contacts_{timestamp}_{uuid.uuid4().hex[:8]}.ndjson.gz"
+
+
+class DatalakeBuffer:
+    """
+    Acumula os eventos do webhook em memória e envia um único arquivo NDJSON
+    comprimido (gzip) quando o lote atinge N eventos, M bytes ou T segundos.
+    Lotes que falham no envio (ou que sobram no shutdown) vão para o spool local
+    e são reenviados no próximo flush; cada lote do spool é reivindicado (rename atômico)
+    por um único processo antes do reenvio, já que o spool é compartilhado pelos workers. Com `archive`, cada lote também é copiado para
+    o arquivo local usado pela reconciliação.
+    """
+
+    def __init__(
+        self,
+        sender,
+        max_events: int = DATALAKE_BATCH_MAX_EVENTS,
+        max_bytes: int = DATALAKE_BATCH_MAX_BYTES,
+        max_seconds: float = DATALAKE_BATCH_MAX_SECONDS,
+        spool_dir: str = DATALAKE_SPOOL_DIR,
+        archive=None
+    ):
+        self.sender = sender
+        self.archive = archive
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.spool_dir = spool_dir
+        self._lines = []
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._stopping = asyncio.Event()
+        self._flushes = set()
+
+    def add(self, event: dict):
+        """Adiciona um evento ao lote atual; dispara o envio em background se o lote estiver cheio."""
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        self._lines.append(line)
+        self._size += len(line)
+
+        if len(self._lines) >= self.max_events or self._size >= self.max_bytes:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def pending(self):
+        return len(self._lines)
+
+    def _take_batch(self):
+        lines, self._lines, self._size = self._lines, [], 0
+        return lines
+
+    async def flush(self):
+        """Envia o lote atual e os lotes pendentes no spool."""
+        async with self._lock:
+            lines = self._take_batch()
+            if lines:
+                filename = batch_filename()
+                content = gzip.compress(b"".join(lines))
+                self._archive(filename, content)
+                if not await self._send(filename, content):
+                    # Data Lake indisponível: guarda o lote e deixa o spool para o próximo flush
+                    self._spool(filename, content)
+                    return
+
+            await self._send_spooled()
+
+    async def _send(self, filename: str, content: bytes):
+        try:
+            await self.sender(filename, BytesIO(content), "application/gzip")
+            return True
+        except Exception as e:
+            logger.error("Falha ao enviar lote %s para o Data Lake: %s", filename, e)
+            return False
+
+    def _archive(self, filename: str, content: bytes):
+        if self.archive is None or not self.archive.enabled:
+            return
+        try:
+            self.archive.store(filename, content)
+        except OSError as e:
+            logger.error("Falha ao arquivar o lote %s localmente: %s", filename, e)
+
+    def _spool(self, filename: str, content: bytes):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # Grava num temporário e renomeia: o reenvio nunca lê um lote pela metade
+        path = os.path.join(self.spool_dir, filename)
+        with open(path + ".tmp", "wb") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+        logger.warning("Lote %s guardado no spool local para reenvio", filename)
+
+    def _claim(self, filename: str):
+        """Renomeia o lote para um nome deste processo; None se outro worker o pegou antes."""
+        claimed = os.path.join(self.spool_dir, f"{filename}{CLAIM_MARKER}{self.owner}")
+        try:
+            os.rename(os.path.join(self.spool_dir, filename), claimed)
+        except FileNotFoundError:
+            return None
+        os.utime(claimed)
+        return claimed
+
+    def _unclaim(self, claimed: str):
+        try:
+            os.rename(claimed, claimed.split(CLAIM_MARKER)[0])
+        except FileNotFoundError:
+            pass
+
+    def _release_stale_claims(self, filenames):
+        for filename in filenames:
+            if CLAIM_MARKER not in filename:
+                continue
+            path = os.path.join(self.spool_dir, filename)
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_CLAIM_SECONDS:
+                    self._unclaim(path)
+            except FileNotFoundError:
+                pass
+
+    async def _send_spooled(self):
+        if not os.path.isdir(self.spool_dir):
+            return
+        filenames = sorted(os.listdir(self.spool_dir))
+        self._release_stale_claims(filenames)
+        for filename in filenames:
+            if not filename.endswith(".ndjson.gz"):
+                continue  # reivindicado por outro worker ou ainda sendo gravado
+            claimed = self._claim(filename)
+            if claimed is None:
+                continue
+            with open(claimed, "rb") as file:
+                content = file.read()
+            if not await self._send(filename, content):
+                self._unclaim(claimed)
+                return
+            try:
+                os.remove(claimed)
+            except FileNotFoundError:
+                pass
+
+    async def _run_timer(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.max_seconds)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Erro no flush periódico do Data Lake: %s", e)
+
+    async def start(self):
+        """Inicia o flush periódico (a cada `max_seconds`)."""
+        self._stopping.clear()
+        self._timer = asyncio.create_task(self._run_timer())
+
+    async def stop(self):
+        """
+        Para o timer e envia o que restou; se o envio falhar, o lote fica no spool.
+        O timer não é cancelado: um flush em andamento termina (ou vai para o spool) antes.
+        """
+        if self._timer:
+            self._stopping.set()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,85 @@
+import logging
+from services import http_client
+from services.shared_cache import SharedCache
+from config.settings import get_upstreams, AC_FIELD_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class FieldCache(SharedCache):
+    """
+    Cache das definições de campos do ActiveCampaign (id → título e título → id).
+    Carregado de uma vez pela listagem /api/3/fields e recarregado pelo TTL ou quando um id não é encontrado.
+    """
+
+    shared_key = "activecampaign_fields"
+
+    def __init__(self, ttl: int = AC_FIELD_CACHE_TTL):
+        super().__init__(ttl)
+        self._titles_by_id = {}
+        self._ids_by_title = {}
+
+    async def _fetch(self):
+        """Todas as definições de campos (paginado)."""
+        upstreams = get_upstreams()
+        headers = {"Api-Token": upstreams.ac_api_key}
+        titles_by_id = {}
+        offset = 0
+
+        while True:
+            response = await http_client.request(
+                http_client.ACTIVECAMPAIGN,
+                "GET",
+                f"{upstreams.ac_api_url}/api/3/fields",
+                params={"limit": 100, "offset": offset},
+                headers=headers
+            )
+            response.raise_for_status()
+            body = response.json()
+            fields = body.get("fields", [])
+
+            for field in fields:
+                titles_by_id[str(field["id"])] = field.get("title")
+
+            offset += len(fields)
+            total = int(body.get("meta", {}).get("total") or 0)
+            if not fields or offset >= total:
+                break
+
+        return titles_by_id
+
+    def _use(self, titles_by_id: dict):
+        self._titles_by_id = titles_by_id
+        self._ids_by_title = {title: field_id for field_id, title in titles_by_id.items() if title}
+
+    async def refresh(self):
+        """Recarrega todas as definições de campos."""
+        titles_by_id = await super().refresh()
+        logger.info("Cache de campos do ActiveCampaign carregado: %s campos", len(titles_by_id))
+        return titles_by_id
+
+    async def get_title(self, field_id):
+        """Retorna o título de um campo pelo id."""
+        field_id = str(field_id)
+        if self._is_stale():
+            await self._ensure_loaded()
+        if field_id not in self._titles_by_id:
+            await self._ensure_loaded(missing=True)
+        return self._titles_by_id.get(field_id)
+
+    async def definitions(self):
+        """Todas as definições carregadas ({id: título})."""
+        if self._is_stale():
+            await self._ensure_loaded()
+        return dict(self._titles_by_id)
+
+    async def get_id(self, title: str):
+        """Retorna o id de um campo pelo título."""
+        if self._is_stale():
+            await self._ensure_loaded()
+        if title not in self._ids_by_title:
+            await self._ensure_loaded(missing=True)
+        return self._ids_by_title.get(title)
+
+
+field_cache = FieldCache()
@@ -1,67 +1,121 @@
-import requests
-from config.settings import ACTIVE_CAMPAIGN_API_KEY, ACTIVE_CAMPAIGN_API_URL, UTM_FIELDS
+import logging
+from services import http_client
+from services.models import Lead
+from services.schema import schema_registry
+from config.logging_config import log_payload
+from config.settings import get_upstreams, AC_PAGE_SIZE
 
-def fetch_field_values(field_url):
-    """Busca os valores dos campos personalizados de um contato no ActiveCampaign."""
+logger = logging.getLogger(__name__)
+
+async def fetch_field_values(field_url):
+    """Busca as UTMs de um contato no ActiveCampaign ({atributo do Lead: valor})."""
     headers = {
-        "Api-Token": ACTIVE_CAMPAIGN_API_KEY,
+        "Api-Token": get_upstreams().ac_api_key,
         "Content-Type": "application/json"
     }
     
-    response = requests.get(field_url, headers=headers)
+    response = await http_client.request(http_client.ACTIVECAMPAIGN, "GET", field_url, headers=headers)
 
     if response.status_code != 200:
-        print(f"❌ Erro ao buscar fieldValues: {response.status_code} - {response.text}")
+        logger.error("Erro ao buscar fieldValues: %s - %s", response.status_code, response.text)
         return {}
 
+    fields = schema_registry.activecampaign_fields
     field_values = response.json().get("fieldValues", [])
-    return {fv["field"]: fv["value"] for fv in field_values}
+    return {fields[fv["field"]]: fv["value"] for fv in field_values if fv.get("field") in fields}
+
+class ActiveCampaignError(Exception):
+    """Erro retornado pela API do ActiveCampaign durante a paginação."""
+
+    def __init__(self, status_code: int, details: str):
+        super().__init__(f"Erro ao buscar contatos: {status_code}")
+        self.status_code = status_code
+        self.details = details
+
+    def to_dict(self):
+        return {"error": str(self), "details": self.details}
+
+
+def format_contact(contact: dict, utms: dict):
+    """Converte um contato bruto do ActiveCampaign no Lead usado pela sincronização."""
+    log_payload(logger, "Contato bruto recebido do ActiveCampaign", contact)
+    return Lead.from_activecampaign(contact, utms)
+
+
+def index_field_values(field_values: list):
+    """
+    Agrupa os fieldValues carregados junto com a página ({contact_id: {atributo do Lead: valor}}).
+    Só os campos de UTM resolvidos pelo registro de schema são mantidos.
+    """
+    fields = schema_registry.activecampaign_fields
+    indexed = {}
+    for fv in field_values:
+        attribute = fields.get(fv.get("field"))
+        if attribute:
+            indexed.setdefault(fv.get("contact"), {})[attribute] = fv.get("value", "")
+    return indexed
+
 
-def get_contacts_by_list(list_id: int):
-    """Busca contatos do ActiveCampaign e extrai as UTMs corretamente."""
+async def iter_contact_pages(
+    list_id: int,
+    page_size: int = None,
+    updated_after: str = None,
+    offset: int = 0,
+    meta: dict = None
+):
+    """
+    Percorre a lista do ActiveCampaign página a página (limit/offset), a partir de `offset`.
+    Com `updated_after`, só os contatos criados ou alterados depois dessa data são buscados.
+    Se `meta` for informado, recebe o total de contatos informado pela API ("total").
+    Cada iteração devolve os contatos já formatados de uma única página.
+    Os fieldValues vêm na mesma requisição (include=fieldValues), sem uma chamada extra por contato.
+    """
+    upstreams = get_upstreams()
     headers = {
-        "Api-Token": ACTIVE_CAMPAIGN_API_KEY,
+        "Api-Token": upstreams.ac_api_key,
         "Content-Type": "application/json"
     }
+    page_size = max(1, min(page_size or AC_PAGE_SIZE, 100))
 
-    url = f"{ACTIVE_CAMPAIGN_API_URL}?listid={list_id}"
-    response = requests.get(url, headers=headers)
+    while True:
+        params = {"listid": list_id, "limit": page_size, "offset": offset, "include": "fieldValues"}
+        if updated_after:
+            params["filters[updated_after]"] = updated_after
+        response = await http_client.request(
+            http_client.ACTIVECAMPAIGN, "GET", upstreams.ac_contacts_url, params=params, headers=headers
+        )
 
-    if response.status_code != 200:
-        return {"error": f"Erro ao buscar contatos: {response.status_code}", "details": response.text}
-
-    contacts = response.json().get("contacts", [])
-    formatted_contacts = []
-
-    for contact in contacts:
-        print(f"\n🔍 Contato Bruto Recebido: {contact}\n")
-
-        email = contact.get("email", "")
-        phone = contact.get("phone", "")
-        first_name = contact.get("firstName", "")
-        last_name = contact.get("lastName", "")
-        created_at = contact.get("created_timestamp", "")
-
-        utm_campaign = utm_medium = utm_content = utm_source = ""
-        field_values_url = contact.get("links", {}).get("fieldValues")
-
-        if field_values_url:
-            field_values = fetch_field_values(field_values_url)
-            utm_campaign = field_values.get(UTM_FIELDS["utm_campaign"], "")
-            utm_medium = field_values.get(UTM_FIELDS["utm_medium"], "")
-            utm_content = field_values.get(UTM_FIELDS["utm_content"], "")
-            utm_source = field_values.get(UTM_FIELDS["utm_source"], "")
-
-        formatted_contacts.append({
-            "first_name": first_name,
-            "last_name": last_name,
-            "email": email,
-            "phone": phone,
-            "created_at": created_at,
-            "utm_campaign": utm_campaign,
-            "utm_medium": utm_medium,
-            "utm_content": utm_content,
-            "utm_source": utm_source
-        })
-
-    return {"contacts": formatted_contacts}
\ No newline at end of file
+        if response.status_code != 200:
+            raise ActiveCampaignError(response.status_code, response.text)
+
+        body = response.json()
+        contacts = body.get("contacts", [])
+        if not contacts:
+            return
+
+        if "fieldValues" in body:
+            field_values = index_field_values(body["fieldValues"])
+        else:
+            # A conta não devolveu o sideload: volta para a busca por contato
+            field_values = {}
+            for contact in contacts:
+                field_values_url = contact.get("links", {}).get("fieldValues")
+                if field_values_url:
+                    field_values[contact.get("id")] = await fetch_field_values(field_values_url)
+
+        if meta is not None and body.get("meta", {}).get("total"):
+            meta["total"] = int(body["meta"]["total"])
+
+        yield [format_contact(contact, field_values.get(contact.get("id"), {})) for contact in contacts]
+
+        offset += len(contacts)
+        total = int(body.get("meta", {}).get("total") or 0)
+        if len(contacts) < page_size or (total and offset >= total):
+            return
+
+
+async def iter_contacts_by_list(list_id: int, page_size: int = None, updated_after: str = None):
+    """Busca contatos do ActiveCampaign (seguindo a paginação) e extrai as UTMs corretamente."""
+    async for page in iter_contact_pages(list_id, page_size, updated_after):
+        for contact in page:
+            yield contact
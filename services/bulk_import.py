@@ -0,0 +1,160 @@
+import asyncio
+import collections
+import csv
+import itertools
+import json
+import logging
+import os
+from services import sync
+from services.jobs import job_store
+from services.models import Lead
+from config.settings import IMPORT_DIR, IMPORT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson"
+}
+
+
+def detect_format(content_type: str, explicit: str = None):
+    """Formato do arquivo pelo parâmetro explícito ou pelo Content-Type; None se não reconhecido."""
+    if explicit:
+        return explicit
+    return CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+
+
+async def receive_upload(stream, path: str):
+    """Grava o corpo recebido em disco, chunk a chunk. Retorna a quantidade de linhas (estimativa do total)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lines, last_byte = 0, b"\n"
+    with open(path, "wb") as file:
+        async for chunk in stream:
+            if chunk:
+                file.write(chunk)
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+    return lines + (last_byte != b"\n")
+
+
+def iter_rows(path: str, file_format: str):
+    """Lê o arquivo linha a linha e devolve (linha, Lead ou None, erro ou None)."""
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, Lead.from_row(row), None
+            return
+
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield line_number, None, "JSON inválido"
+                continue
+            if not isinstance(data, dict):
+                yield line_number, None, "a linha não é um objeto JSON"
+                continue
+            yield line_number, Lead.from_row(data), None
+
+
+def _next_batch(rows, size: int):
+    return list(itertools.islice(rows, size))
+
+
+def _skip(rows, count: int):
+    collections.deque(itertools.islice(rows, count), maxlen=0)
+
+
+def upload_path(job_id: str, file_format: str):
+    return os.path.join(IMPORT_DIR, f"{job_id}.{file_format}")
+
+
+async def run_import(job_id: str, params: dict, checkpoint: dict = None):
+    """
+    Processa o arquivo em lotes de IMPORT_BATCH_SIZE linhas pelo mesmo caminho da sincronização
+    (pessoa → negócio, deduplicação, fila bulk do rate limit), gravando progresso e checkpoint
+    (linhas já lidas) a cada lote. Retomado, pula as linhas dos lotes já concluídos.
+    O arquivo só é apagado quando a importação termina.
+    """
+    path = upload_path(job_id, params["format"])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"arquivo da importação não encontrado: {path}")
+
+    rows_done = (checkpoint or {}).get("rows", 0)
+    rows = iter_rows(path, params["format"])
+    try:
+        if rows_done:
+            await asyncio.to_thread(_skip, rows, rows_done)
+
+        while True:
+            # A leitura do disco fica fora do event loop
+            batch = await asyncio.to_thread(_next_batch, rows, IMPORT_BATCH_SIZE)
+            if not batch:
+                break
+
+            leads, errors = [], []
+            for line_number, lead, error in batch:
+                if error is None and not lead.has_contact_channel:
+                    error = "contato sem email e sem telefone"
+                if error:
+                    errors.append({"line": line_number, "error": error})
+                else:
+                    leads.append(lead)
+
+            results = await sync.sync_contacts(
+                leads, params["pipeline_id"], params.get("concurrency"), params.get("batch_size")
+            ) if leads else []
+            failed = [result for result in results if result.get("error")]
+            errors.extend({"email": result["email"], "error": result["error"]} for result in failed)
+
+            rows_done += len(batch)
+            await job_store.progress(
+                job_id,
+                processed=len(leads) - len(failed),
+                failed=len(errors),
+                errors=errors,
+                checkpoint={"rows": rows_done}
+            )
+    finally:
+        rows.close()
+
+    # O total da recepção é estimado pelas quebras de linha (campos CSV com várias linhas,
+    # linhas em branco); ao final, vale o que foi efetivamente lido
+    await job_store.progress(job_id, total=rows_done)
+    os.remove(path)
+
+
+async def start_import(stream, file_format: str, pipeline_id: int, concurrency: int = None, batch_size: int = None):
+    """Recebe o arquivo, cria o job e inicia o processamento em background. Retorna o id do job."""
+    params = {"pipeline_id": pipeline_id, "format": file_format, "concurrency": concurrency, "batch_size": batch_size}
+    job_id = await job_store.create("import", params)
+
+    path = upload_path(job_id, file_format)
+    try:
+        lines = await receive_upload(stream, path)
+    except BaseException as e:
+        await job_store.fail(job_id, f"upload interrompido: {e!r}")
+        # O arquivo parcial nunca será processado
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+    total = lines - 1 if file_format == "csv" else lines
+    await job_store.progress(job_id, total=max(total, 0))
+    logger.info("Importação %s recebida: ~%s linhas para o funil %s", job_id, total, pipeline_id)
+
+    job_store.launch(job_id, "import", params)
+    return job_id
+
+
+job_store.register("import", run_import)
@@ -0,0 +1,95 @@
+import logging
+import time
+from services import metrics
+from config.settings import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """O upstream está com o circuito aberto: a chamada falha na hora, sem ir à rede."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"Circuito aberto para {upstream}; nova tentativa em {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um upstream.
+    - closed: as chamadas passam; `failure_threshold` falhas seguidas abrem o circuito.
+    - open: as chamadas falham na hora com CircuitOpenError durante `reset_timeout` segundos.
+    - half_open: uma única chamada de teste passa; sucesso fecha o circuito, falha reabre.
+    Falha é erro de transporte (timeout, conexão recusada…) ou resposta 5xx.
+    """
+
+    def __init__(self, upstream: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probe_in_flight = False
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning("Circuito de %s: %s → %s", self.upstream, self.state, state)
+        self.state = state
+        metrics.circuit_transitions.inc(upstream=self.upstream, state=state)
+
+    @property
+    def is_open(self):
+        """True enquanto as chamadas estão sendo recusadas (aberto e ainda sem direito a teste)."""
+        return self.state == OPEN and self.retry_after > 0
+
+    @property
+    def retry_after(self):
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def before_call(self):
+        """Levanta CircuitOpenError se a chamada não puder ir ao upstream agora."""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            if self.retry_after > 0:
+                raise CircuitOpenError(self.upstream, self.retry_after)
+            self._transition(HALF_OPEN)
+        # half_open: só uma chamada de teste por vez
+        if self._probe_in_flight:
+            raise CircuitOpenError(self.upstream, self.reset_timeout)
+        self._probe_in_flight = True
+
+    def release(self):
+        """Libera a chamada de teste sem resultado (ex.: requisição cancelada)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self._probe_in_flight = False
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self, error: str):
+        self._probe_in_flight = False
+        self.failures += 1
+        self.last_error = error
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after_seconds": round(self.retry_after, 1),
+            "last_error": self.last_error
+        }
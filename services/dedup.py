@@ -0,0 +1,161 @@
+import logging
+import time
+from services import pipedrive, schema
+from services.ratelimit import pipedrive_scheduler
+from services.sqlite_store import SQLiteStore
+from services.models import normalize_email, normalize_phone
+from config.settings import (
+    get_upstreams,
+    DEDUP_INDEX_PATH,
+    DEDUP_REMOTE_LOOKUP
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    key TEXT PRIMARY KEY,
+    person_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deals (
+    person_id INTEGER NOT NULL,
+    pipeline_id INTEGER NOT NULL,
+    deal_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (person_id, pipeline_id)
+);
+"""
+
+
+def lead_keys(email, phone):
+    """Chaves de deduplicação de um lead (email normalizado e telefone só com dígitos)."""
+    keys = []
+    email = normalize_email(email)
+    if email:
+        keys.append(f"email:{email}")
+    phone = normalize_phone(phone)
+    if phone:
+        keys.append(f"phone:{phone}")
+    return keys
+
+
+def lookup_key(email, phone):
+    """
+    Chave usada para procurar a pessoa: o email quando o lead tem um; o telefone só na falta dele
+    (leads diferentes podem compartilhar um telefone, e não devem cair na mesma pessoa).
+    """
+    keys = lead_keys(email, phone)
+    return keys[0] if keys else None
+
+
+class DedupIndex(SQLiteStore):
+    """
+    Índice local idempotente: email/telefone normalizados → person_id no Pipedrive,
+    e (person_id, funil) → deal_id. Preenchido a partir das respostas de criação.
+    """
+
+    schema = _SCHEMA
+
+    def __init__(self, path: str = DEDUP_INDEX_PATH):
+        super().__init__(path)
+
+    def _find_person(self, key):
+        if not key:
+            return None
+        row = self._execute(lambda conn: conn.execute(
+            "SELECT person_id FROM persons WHERE key = ?", (key,)
+        ).fetchone())
+        return row[0] if row else None
+
+    def _remember_person(self, keys, person_id):
+        now = time.time()
+        self._execute(lambda conn: conn.executemany(
+            "INSERT INTO persons (key, person_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET person_id = excluded.person_id, updated_at = excluded.updated_at",
+            [(key, person_id, now) for key in keys]
+        ))
+
+    def _find_deal(self, person_id, pipeline_id):
+        row = self._execute(lambda conn: conn.execute(
+            "SELECT deal_id FROM deals WHERE person_id = ? AND pipeline_id = ?",
+            (person_id, pipeline_id)
+        ).fetchone())
+        return row[0] if row else None
+
+    def _remember_deal(self, person_id, pipeline_id, deal_id):
+        self._execute(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO deals (person_id, pipeline_id, deal_id, updated_at) VALUES (?, ?, ?, ?)",
+            (person_id, pipeline_id, deal_id, time.time())
+        ))
+
+    def _stats(self):
+        return self._execute(lambda conn: {
+            "keys": conn.execute("SELECT COUNT(*) FROM persons").fetchone()[0],
+            "deals": conn.execute("SELECT COUNT(*) FROM deals").fetchone()[0]
+        })
+
+    async def find_person(self, email, phone):
+        """Retorna o person_id já conhecido para o email (ou, sem email, para o telefone), ou None."""
+        key = lookup_key(email, phone)
+        person_id = await self.run(self._find_person, key)
+        if person_id is None and key and DEDUP_REMOTE_LOOKUP:
+            person_id = await search_person(email, phone)
+            if person_id:
+                await self.run(self._remember_person, lead_keys(email, phone), person_id)
+        return person_id
+
+    async def remember_person(self, email, phone, person_id):
+        keys = lead_keys(email, phone)
+        if keys and person_id:
+            await self.run(self._remember_person, keys, person_id)
+
+    async def find_deal(self, person_id, pipeline_id):
+        return await self.run(self._find_deal, int(person_id), int(pipeline_id))
+
+    async def remember_deal(self, person_id, pipeline_id, deal_id):
+        if person_id and deal_id:
+            await self.run(self._remember_deal, int(person_id), int(pipeline_id), int(deal_id))
+
+    async def stats(self):
+        return await self.run(self._stats)
+
+    async def backfill(self):
+        """Preenche o índice com as pessoas que já existem no Pipedrive (paginado)."""
+        email_key = schema.schema_registry.key(schema.PIPEDRIVE_PERSON, "email_personalizado")
+        phone_key = schema.schema_registry.key(schema.PIPEDRIVE_PERSON, "telefone_personalizado")
+        indexed = 0
+
+        async for page in pipedrive.iter_pages(get_upstreams().pipedrive_persons_url):
+            for person in page:
+                keys = lead_keys(person.get(email_key), person.get(phone_key))
+                if keys:
+                    await self.run(self._remember_person, keys, person["id"])
+                    indexed += 1
+
+        logger.info("Índice de deduplicação preenchido com %s pessoas do Pipedrive", indexed)
+        return indexed
+
+
+async def search_person(email, phone):
+    """
+    Procura a pessoa na busca de pessoas do Pipedrive pelo email personalizado
+    ou, se o lead não tiver email, pelo telefone personalizado.
+    """
+    term = normalize_email(email) or normalize_phone(phone)
+    if not term:
+        return None
+    upstreams = get_upstreams()
+    response = await pipedrive_scheduler.request(
+        "GET",
+        upstreams.pipedrive_persons_search_url,
+        params={"api_token": upstreams.pipedrive_api_key, "term": term, "fields": "custom_fields", "exact_match": "true"}
+    )
+    if response.status_code != 200:
+        logger.warning("Busca de pessoas no Pipedrive falhou: %s - %s", response.status_code, response.text)
+        return None
+    items = (response.json().get("data") or {}).get("items") or []
+    return items[0]["item"]["id"] if items else None
+
+
+dedup_index = DedupIndex()
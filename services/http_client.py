@@ -0,0 +1,114 @@
+import time
+import httpx
+from services import metrics
+from services.circuit_breaker import CircuitBreaker
+from config.settings import (
+    HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    PIPEDRIVE_TIMEOUT_SECONDS,
+    ACTIVECAMPAIGN_TIMEOUT_SECONDS,
+    DATALAKE_TIMEOUT_SECONDS
+)
+
+# Upstreams com pool de conexões próprio
+PIPEDRIVE = "pipedrive"
+ACTIVECAMPAIGN = "activecampaign"
+DATALAKE = "datalake"
+
+UPSTREAMS = (PIPEDRIVE, ACTIVECAMPAIGN, DATALAKE)
+
+TIMEOUTS = {
+    PIPEDRIVE: PIPEDRIVE_TIMEOUT_SECONDS,
+    ACTIVECAMPAIGN: ACTIVECAMPAIGN_TIMEOUT_SECONDS,
+    DATALAKE: DATALAKE_TIMEOUT_SECONDS
+}
+
+# Um circuit breaker por upstream, compartilhado por todos os serviços
+breakers = {upstream: CircuitBreaker(upstream) for upstream in UPSTREAMS}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+# Transporte alternativo para todos os upstreams (ex.: o mock local do benchmark)
+_transport_override = None
+
+
+def use_transport(transport):
+    """
+    Faz todos os upstreams usarem `transport` (None volta ao padrão).
+    Os clientes já criados são descartados e recriados na próxima requisição.
+    """
+    global _transport_override
+    _transport_override = transport
+    _clients.clear()
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    """Cria o cliente assíncrono (keep-alive) de um upstream."""
+    return httpx.AsyncClient(
+        transport=_transport_override,
+        timeout=httpx.Timeout(TIMEOUTS[upstream], connect=min(HTTP_CONNECT_TIMEOUT_SECONDS, TIMEOUTS[upstream])),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    """
+    Retorna o cliente compartilhado do upstream, criado na primeira requisição
+    (um upstream que não é usado, como o Data Lake sem eventos, não abre pool).
+    """
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = _clients[upstream] = _build_client(upstream)
+    return client
+
+
+def _operation(url: str):
+    """Rótulo da operação para as métricas: último trecho não numérico do path (ex.: persons, fieldValues)."""
+    path = httpx.URL(url).path
+    for segment in reversed(path.strip("/").split("/")):
+        if segment and not segment.isdigit():
+            return segment
+    return "root"
+
+
+async def request(upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Executa uma requisição pelo pool do upstream informado (com latência e status nas métricas).
+    Com o circuito do upstream aberto, levanta CircuitOpenError sem ir à rede.
+    """
+    breaker = breakers[upstream]
+    breaker.before_call()
+
+    operation = f"{method} {_operation(url)}"
+    status = "error"
+    start = time.perf_counter()
+    try:
+        response = await get_client(upstream).request(method, url, **kwargs)
+        status = response.status_code
+        if status >= 500:
+            breaker.record_failure(f"HTTP {status}")
+        else:
+            breaker.record_success()
+        return response
+    except httpx.TransportError as e:
+        breaker.record_failure(f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        # Cancelamento ou erro local: não diz nada sobre a saúde do upstream
+        breaker.release()
+        raise
+    finally:
+        metrics.upstream_request_duration.observe(time.perf_counter() - start, upstream=upstream, operation=operation)
+        metrics.upstream_requests.inc(upstream=upstream, operation=operation, status=status)
+
+
+async def shutdown():
+    """Fecha todos os pools no shutdown da aplicação."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
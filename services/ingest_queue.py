@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from services import metrics
+from services.sqlite_store import SQLiteStore
+from services.circuit_breaker import CircuitOpenError
+from config.settings import (
+    INGEST_QUEUE_PATH,
+    INGEST_WORKERS,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_RETRY_BASE_SECONDS,
+    INGEST_LEASE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Intervalo de polling quando a fila está vazia
+IDLE_POLL_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS queue_ready ON queue (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+# Colunas adicionadas depois da primeira versão da tabela
+_MIGRATIONS = (
+    "ALTER TABLE queue ADD COLUMN claimed_by TEXT",
+    "ALTER TABLE queue ADD COLUMN claimed_at REAL",
+)
+
+
+class IngestQueue(SQLiteStore):
+    """
+    Fila durável (SQLite) de leads recebidos por webhook.
+    Itens com falha voltam para a fila com backoff exponencial; depois de
+    `max_attempts` tentativas vão para a tabela de dead letters.
+    Cada item em processamento tem um lease (processo que o pegou e quando), renovado
+    enquanto o processo vive: com vários workers no mesmo arquivo, só voltam para a fila
+    os itens cujo lease venceu (o processo que os pegou caiu), nunca os de um worker ativo.
+    """
+
+    schema = _SCHEMA
+    migrations = _MIGRATIONS
+
+    def __init__(
+        self,
+        path: str = INGEST_QUEUE_PATH,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+        lease_seconds: float = INGEST_LEASE_SECONDS
+    ):
+        super().__init__(path)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = None
+        self._workers = []
+        self._lease_task = None
+
+    # Operações síncronas (executadas fora do event loop)
+
+    def _put(self, payload: dict):
+        now = time.time()
+        return self._execute(lambda conn: conn.execute(
+            "INSERT INTO queue (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+            (json.dumps(payload, ensure_ascii=False), now, now)
+        ).lastrowid)
+
+    def _claim(self):
+        def claim(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM queue WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE queue SET status = 'processing', attempts = attempts + 1, claimed_by = ?, claimed_at = ? "
+                    "WHERE id = ?",
+                    (self.owner, now, row[0])
+                )
+            return row
+        return self._execute(claim)
+
+    def _complete(self, item_id: int):
+        self._execute(lambda conn: conn.execute("DELETE FROM queue WHERE id = ?", (item_id,)))
+
+    def _fail(self, item_id: int, attempts: int, error: str):
+        def fail(conn):
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "INSERT INTO dead_letters (id, payload, attempts, last_error, created_at, failed_at) "
+                    "SELECT id, payload, attempts, ?, created_at, ? FROM queue WHERE id = ?",
+                    (error, time.time(), item_id)
+                )
+                conn.execute("DELETE FROM queue WHERE id = ?", (item_id,))
+                return True
+            delay = INGEST_RETRY_BASE_SECONDS * (2 ** (attempts - 1)) * (0.5 + random.random())
+            conn.execute(
+                "UPDATE queue SET status = 'pending', next_attempt_at = ?, last_error = ?, claimed_by = NULL, "
+                "claimed_at = NULL WHERE id = ?",
+                (time.time() + delay, error, item_id)
+            )
+            return False
+        return self._execute(fail)
+
+    def _postpone(self, item_id: int, delay: float):
+        """Devolve o item sem contar a tentativa (o upstream estava indisponível, não o item)."""
+        self._execute(lambda conn: conn.execute(
+            "UPDATE queue SET status = 'pending', attempts = attempts - 1, next_attempt_at = ?, "
+            "claimed_by = NULL, claimed_at = NULL WHERE id = ?",
+            (time.time() + delay, item_id)
+        ))
+
+    def _recover(self):
+        """Itens em processamento com o lease vencido (o processo que os pegou parou) voltam para a fila."""
+        return self._execute(lambda conn: conn.execute(
+            "UPDATE queue SET status = 'pending', claimed_by = NULL, claimed_at = NULL "
+            "WHERE status = 'processing' AND (claimed_at IS NULL OR claimed_at < ?)",
+            (time.time() - self.lease_seconds,)
+        ).rowcount)
+
+    def _renew(self):
+        """Renova o lease dos itens que este processo está processando."""
+        self._execute(lambda conn: conn.execute(
+            "UPDATE queue SET claimed_at = ? WHERE status = 'processing' AND claimed_by = ?",
+            (time.time(), self.owner)
+        ))
+
+    def _release(self):
+        """Devolve para a fila, sem esperar o lease vencer, os itens deste processo (shutdown)."""
+        return self._execute(lambda conn: conn.execute(
+            "UPDATE queue SET status = 'pending', attempts = MAX(attempts - 1, 0), claimed_by = NULL, "
+            "claimed_at = NULL WHERE status = 'processing' AND claimed_by = ?",
+            (self.owner,)
+        ).rowcount)
+
+    def _requeue_dead_letter(self, item_id: int):
+        def requeue(conn):
+            row = conn.execute("SELECT payload, created_at FROM dead_letters WHERE id = ?", (item_id,)).fetchone()
+            if not row:
+                return False
+            conn.execute(
+                "INSERT INTO queue (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+                (row[0], time.time(), row[1])
+            )
+            conn.execute("DELETE FROM dead_letters WHERE id = ?", (item_id,))
+            return True
+        return self._execute(requeue)
+
+    def _stats(self):
+        def stats(conn):
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall())
+            dead = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+            return {
+                "pending": counts.get("pending", 0),
+                "processing": counts.get("processing", 0),
+                "dead_letters": dead,
+                "workers": len(self._workers)
+            }
+        return self._execute(stats)
+
+    def _dead_letters(self, limit: int):
+        rows = self._execute(lambda conn: conn.execute(
+            "SELECT id, payload, attempts, last_error, failed_at FROM dead_letters ORDER BY failed_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall())
+        return [
+            {"id": row[0], "payload": json.loads(row[1]), "attempts": row[2], "last_error": row[3], "failed_at": row[4]}
+            for row in rows
+        ]
+
+    # API assíncrona
+
+    async def put(self, payload: dict):
+        """Grava um item na fila e acorda os workers. Retorna o id do item."""
+        item_id = await self.run(self._put, payload)
+        if self._wakeup:
+            self._wakeup.set()
+        return item_id
+
+    async def stats(self):
+        return await self.run(self._stats)
+
+    async def dead_letters(self, limit: int = 100):
+        return await self.run(self._dead_letters, limit)
+
+    async def requeue_dead_letter(self, item_id: int):
+        requeued = await self.run(self._requeue_dead_letter, item_id)
+        if requeued and self._wakeup:
+            self._wakeup.set()
+        return requeued
+
+    async def _worker(self, handler):
+        while True:
+            try:
+                item = await self.run(self._claim)
+            except Exception as e:
+                logger.error("Erro ao ler a fila de ingestão: %s", e)
+                item = None
+
+            if not item:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            item_id, payload, attempts = item[0], json.loads(item[1]), item[2] + 1
+            try:
+                await handler(payload)
+                await self.run(self._complete, item_id)
+            except asyncio.CancelledError:
+                raise
+            except CircuitOpenError as e:
+                await self.run(self._postpone, item_id, e.retry_after)
+                metrics.upstream_retries.inc(upstream="ingest_queue", reason="circuit_open")
+            except Exception as e:
+                dead = await self.run(self._fail, item_id, attempts, str(e))
+                metrics.upstream_retries.inc(upstream="ingest_queue", reason="dead_letter" if dead else "retry")
+                if dead:
+                    logger.error("Item %s da fila enviado para dead letters após %s tentativas: %s", item_id, attempts, e)
+                else:
+                    logger.warning("Falha ao processar item %s da fila (tentativa %s): %s", item_id, attempts, e)
+
+    async def _recover_expired(self):
+        recovered = await self.run(self._recover)
+        if recovered:
+            logger.info("%s itens da fila de ingestão com lease vencido voltaram para a fila", recovered)
+            if self._wakeup:
+                self._wakeup.set()
+
+    async def _keep_leases(self):
+        # Renova os próprios leases e recupera os de processos que pararam
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.run(self._renew)
+                await self._recover_expired()
+            except Exception as e:
+                logger.error("Erro ao renovar os leases da fila de ingestão: %s", e)
+
+    async def start(self, handler, workers: int = INGEST_WORKERS):
+        """Recupera itens com lease vencido e inicia os workers em background."""
+        self._wakeup = asyncio.Event()
+        await self._recover_expired()
+        self._workers = [asyncio.create_task(self._worker(handler)) for _ in range(max(1, workers))]
+        self._lease_task = asyncio.create_task(self._keep_leases())
+
+    async def stop(self):
+        """Para os workers e devolve para a fila os itens que eles estavam processando."""
+        tasks = self._workers + ([self._lease_task] if self._lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._lease_task = [], None
+        try:
+            released = await self.run(self._release)
+            if released:
+                logger.info("%s itens em processamento devolvidos para a fila", released)
+        except Exception as e:
+            logger.error("Erro ao devolver os itens da fila de ingestão: %s", e)
+        self.close()
+
+
+ingest_queue = IngestQueue()
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from services.sqlite_store import SQLiteStore
+from config.settings import JOBS_PATH, JOB_STALE_SECONDS, JOB_WATCHDOG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+# Quantos erros de linha/contato são guardados por job
+MAX_ERRORS = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total INTEGER,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    errors TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    checkpoint TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+"""
+
+# Colunas adicionadas depois da primeira versão da tabela
+_MIGRATIONS = (
+    "ALTER TABLE jobs ADD COLUMN checkpoint TEXT",
+)
+
+_COLUMNS = (
+    "id", "kind", "status", "params", "total", "processed", "failed",
+    "errors", "error", "created_at", "started_at", "updated_at", "finished_at", "checkpoint"
+)
+
+
+def _to_dict(row):
+    job = dict(zip(_COLUMNS, row))
+    job["params"] = json.loads(job["params"])
+    job["errors"] = json.loads(job["errors"])
+    job["checkpoint"] = json.loads(job["checkpoint"]) if job["checkpoint"] else None
+
+    done = job["processed"] + job["failed"]
+    job["remaining"] = max(job["total"] - done, 0) if job["total"] is not None else None
+    end = job["finished_at"] or job["updated_at"]
+    elapsed = end - job["started_at"] if job["started_at"] else None
+    job["elapsed_seconds"] = round(elapsed, 1) if elapsed is not None else None
+    job["throughput_per_second"] = round(done / elapsed, 2) if elapsed else None
+    return job
+
+
+class JobStore(SQLiteStore):
+    """
+    Jobs em background e seu progresso (SQLite, visível para todos os workers do host).
+    Cada tipo de job registra um runner `runner(job_id, params, checkpoint)`, que grava
+    o progresso e o checkpoint a cada trecho concluído. Jobs interrompidos (shutdown) ou
+    parados (sem progresso há JOB_STALE_SECONDS, ex.: worker que caiu) são retomados
+    do último checkpoint no startup e pelo watchdog, por qualquer worker.
+    """
+
+    schema = _SCHEMA
+    migrations = _MIGRATIONS
+
+    def __init__(self, path: str = JOBS_PATH, stale_after: float = JOB_STALE_SECONDS):
+        super().__init__(path)
+        self.stale_after = stale_after
+        self._runners = {}
+        self._tasks = {}
+        self._watchdog = None
+
+    def _create(self, kind, params, total):
+        job_id = uuid.uuid4().hex[:16]
+        now = time.time()
+        self._execute(lambda conn: conn.execute(
+            "INSERT INTO jobs (id, kind, status, params, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(params, ensure_ascii=False), total, now, now)
+        ))
+        return job_id
+
+    def _get(self, job_id):
+        row = self._execute(lambda conn: conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone())
+        return _to_dict(row) if row else None
+
+    def _list(self, limit):
+        rows = self._execute(lambda conn: conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall())
+        return [_to_dict(row) for row in rows]
+
+    def _set_status(self, job_id, status, error=None):
+        now = time.time()
+
+        def update(conn):
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(?, error), updated_at = ?, "
+                "started_at = CASE WHEN ? = 'running' THEN COALESCE(started_at, ?) ELSE started_at END, "
+                "finished_at = CASE WHEN ? IN ('completed', 'failed') THEN ? ELSE finished_at END "
+                "WHERE id = ?",
+                (status, error, now, status, now, status, now, job_id)
+            )
+        self._execute(update)
+
+    def _progress(self, job_id, processed, failed, errors, total, checkpoint):
+        def update(conn):
+            row = conn.execute("SELECT errors FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            kept = (json.loads(row[0]) if row else []) + errors
+            conn.execute(
+                "UPDATE jobs SET processed = processed + ?, failed = failed + ?, errors = ?, "
+                "total = COALESCE(?, total), checkpoint = COALESCE(?, checkpoint), updated_at = ? WHERE id = ?",
+                (
+                    processed, failed, json.dumps(kept[:MAX_ERRORS], ensure_ascii=False), total,
+                    json.dumps(checkpoint, ensure_ascii=False) if checkpoint is not None else None,
+                    time.time(), job_id
+                )
+            )
+        self._execute(update)
+
+    def _touch(self, job_id):
+        self._execute(lambda conn: conn.execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING)
+        ))
+
+    def _claim_resumable(self, job_id=None):
+        """
+        Marca como running (nesta transação, para um único worker ganhar) os jobs a retomar:
+        interrompidos, ou running sem progresso há mais de `stale_after` segundos.
+        Com `job_id`, reivindica só esse job se ele não estiver rodando nem concluído.
+        """
+        now = time.time()
+
+        def claim(conn):
+            if job_id:
+                rows = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ? AND (status IN (?, ?) "
+                    "OR (status = ? AND updated_at < ?))",
+                    (job_id, INTERRUPTED, FAILED, RUNNING, now - self.stale_after)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? "
+                    "OR (status = ? AND updated_at < ?)",
+                    (INTERRUPTED, RUNNING, now - self.stale_after)
+                ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = NULL, finished_at = NULL, updated_at = ? WHERE id = ?",
+                    (RUNNING, now, row[0])
+                )
+            return [_to_dict(row) for row in rows]
+        return self._execute(claim)
+
+    def register(self, kind: str, runner):
+        """Registra o runner de um tipo de job."""
+        self._runners[kind] = runner
+
+    async def create(self, kind: str, params: dict, total: int = None):
+        return await self.run(self._create, kind, params, total)
+
+    async def get(self, job_id: str):
+        return await self.run(self._get, job_id)
+
+    async def list(self, limit: int = 20):
+        return await self.run(self._list, limit)
+
+    async def fail(self, job_id: str, error: str):
+        await self.run(self._set_status, job_id, FAILED, error)
+
+    async def progress(
+        self,
+        job_id: str,
+        processed: int = 0,
+        failed: int = 0,
+        errors: list = (),
+        total: int = None,
+        checkpoint: dict = None
+    ):
+        """Soma o progresso de um trecho (e os primeiros erros) ao job e grava o checkpoint, na mesma transação."""
+        await self.run(self._progress, job_id, processed, failed, list(errors), total, checkpoint)
+
+    def launch(self, job_id: str, kind: str, params: dict, checkpoint: dict = None):
+        """Executa o runner do job em background, marcando running/completed/failed/interrupted."""
+        runner = self._runners[kind]
+
+        async def heartbeat():
+            # Mantém o job "vivo" mesmo quando um trecho demora (ex.: rate limit), para não ser retomado em dobro
+            while True:
+                await asyncio.sleep(self.stale_after / 3)
+                await self.run(self._touch, job_id)
+
+        async def run():
+            await self.run(self._set_status, job_id, RUNNING)
+            beat = asyncio.create_task(heartbeat())
+            try:
+                await runner(job_id, params, checkpoint)
+            except asyncio.CancelledError:
+                await self.run(self._set_status, job_id, INTERRUPTED)
+                raise
+            except Exception as e:
+                logger.exception("Job %s falhou: %s", job_id, e)
+                await self.run(self._set_status, job_id, FAILED, str(e))
+            else:
+                await self.run(self._set_status, job_id, COMPLETED)
+                logger.info("Job %s concluído", job_id)
+            finally:
+                beat.cancel()
+                self._tasks.pop(job_id, None)
+
+        self._tasks[job_id] = asyncio.create_task(run())
+
+    async def submit(self, kind: str, params: dict, total: int = None):
+        """Cria e inicia um job. Retorna o id."""
+        job_id = await self.create(kind, params, total)
+        self.launch(job_id, kind, params)
+        return job_id
+
+    async def resume(self, job_id: str = None):
+        """Retoma do último checkpoint o job informado, ou todos os jobs interrompidos/parados."""
+        jobs = await self.run(self._claim_resumable, job_id)
+        for job in jobs:
+            if job["kind"] not in self._runners:
+                logger.warning("Job %s de tipo desconhecido (%s) não foi retomado", job["id"], job["kind"])
+                continue
+            logger.info("Retomando job %s (%s) do checkpoint %s", job["id"], job["kind"], job["checkpoint"])
+            self.launch(job["id"], job["kind"], job["params"], job["checkpoint"])
+        return [job["id"] for job in jobs]
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(JOB_WATCHDOG_SECONDS)
+            try:
+                await self.resume()
+            except Exception as e:
+                logger.error("Erro ao verificar jobs parados: %s", e)
+
+    async def start(self):
+        """No startup: retoma os jobs interrompidos e inicia o watchdog dos jobs parados."""
+        await self.resume()
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Cancela os jobs em andamento (ficam como interrompidos e são retomados no próximo startup)."""
+        tasks = list(self._tasks.values())
+        if self._watchdog:
+            tasks.append(self._watchdog)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.close()
+
+
+job_store = JobStore()
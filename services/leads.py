@@ -0,0 +1,50 @@
+from services import pipedrive, metrics
+from services.models import Lead, normalize_email, normalize_phone
+from services.singleflight import SingleFlight
+from config.settings import LEAD_SINGLEFLIGHT_TTL_SECONDS
+
+# Entregas repetidas do mesmo lead para o mesmo funil compartilham uma única criação
+lead_flights = SingleFlight(LEAD_SINGLEFLIGHT_TTL_SECONDS, namespace="lead_results")
+
+
+def flight_key(lead: Lead, pipeline_info: dict):
+    """(email ou telefone normalizado, funil); None quando o lead não tem nenhum dos dois."""
+    identity = normalize_email(lead.email) or normalize_phone(lead.phone)
+    if not identity:
+        return None
+    return identity, pipeline_info["pipeline_id"]
+
+
+async def _create_lead(lead: Lead, pipeline_info: dict):
+    # Criar contato no Pipedrive
+    person_id = await pipedrive.create_contact_with_custom_fields(lead)
+
+    # Criar deal no funil correto
+    await pipedrive.create_deal_with_pipeline(
+        person_id=person_id,
+        lead=lead,
+        pipeline_info=pipeline_info
+    )
+
+    return person_id
+
+
+async def create_lead(lead: Lead, pipeline_info: dict):
+    """
+    Cria o contato e o negócio de um lead recebido por webhook. Retorna o id da pessoa.
+    Entregas simultâneas ou recentes do mesmo lead para o mesmo funil reaproveitam a mesma criação.
+    """
+    key = flight_key(lead, pipeline_info)
+    if key is None:
+        return await _create_lead(lead, pipeline_info)
+
+    return await lead_flights.do(
+        key,
+        lambda: _create_lead(lead, pipeline_info),
+        on_shared=lambda source: metrics.leads_coalesced.inc(source=source)
+    )
+
+
+async def process_queued_lead(payload: dict):
+    """Handler dos workers da fila de ingestão."""
+    await create_lead(Lead.from_dict(payload["contact"]), payload["pipeline"])
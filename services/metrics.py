@@ -0,0 +1,123 @@
+import bisect
+import threading
+
+# Buckets (segundos) das latências de rotas e upstreams
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Contador monotônico com labels, no formato de exposição do Prometheus."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Histograma cumulativo com labels, no formato de exposição do Prometheus."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+_registry = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """Todas as métricas no formato texto do Prometheus (exposição 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# Rotas da API
+http_request_duration = _register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições por rota.", ("method", "route", "status")
+))
+
+# Chamadas aos upstreams (Pipedrive, ActiveCampaign, Data Lake)
+upstream_request_duration = _register(Histogram(
+    "upstream_request_duration_seconds", "Latência das chamadas aos upstreams.", ("upstream", "operation")
+))
+upstream_requests = _register(Counter(
+    "upstream_requests_total", "Chamadas aos upstreams por status.", ("upstream", "operation", "status")
+))
+upstream_retries = _register(Counter(
+    "upstream_retries_total", "Novas tentativas de chamadas aos upstreams.", ("upstream", "reason")
+))
+circuit_transitions = _register(Counter(
+    "upstream_circuit_transitions_total", "Mudanças de estado do circuit breaker por upstream.", ("upstream", "state")
+))
+
+# Leads
+persons_created = _register(Counter("pipedrive_persons_created_total", "Pessoas criadas no Pipedrive."))
+deals_created = _register(Counter("pipedrive_deals_created_total", "Negócios criados no Pipedrive."))
+duplicates_skipped = _register(Counter(
+    "lead_duplicates_skipped_total", "Criações evitadas pelo índice de deduplicação.", ("kind",)
+))
+leads_coalesced = _register(Counter(
+    "lead_deliveries_coalesced_total",
+    "Entregas repetidas do mesmo lead atendidas pela criação em andamento ou pelo resultado recente.",
+    ("source",)
+))
@@ -0,0 +1,128 @@
+import re
+from dataclasses import dataclass, fields
+
+
+def normalize_email(email):
+    email = (email or "").strip().lower()
+    return email if "@" in email else None
+
+
+def normalize_phone(phone):
+    digits = re.sub(r"\D", "", str(phone or ""))
+    return digits if len(digits) >= 8 else None
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+@dataclass(slots=True)
+class Lead:
+    """
+    Contato único usado do webhook/sincronização até a criação no Pipedrive.
+    Email em minúsculas e sem espaços; telefone sem espaços nas pontas (o formato original é mantido).
+    """
+    email: str = ""
+    phone: str = ""
+    first_name: str = ""
+    last_name: str = ""
+    utm_campaign: str = ""
+    utm_source: str = ""
+    utm_medium: str = ""
+    utm_content: str = ""
+    created_at: str = ""
+    updated_at: str = ""
+
+    def __post_init__(self):
+        self.email = _text(self.email).lower()
+        self.phone = _text(self.phone)
+
+    @classmethod
+    def from_webhook(cls, contact: dict):
+        """Contato no formato dos webhooks do ActiveCampaign (firstName, lastName, utm_*)."""
+        return cls(
+            email=contact.get("email"),
+            phone=contact.get("phone"),
+            first_name=contact.get("firstName") or "Desconhecido",
+            last_name=contact.get("lastName") or "",
+            utm_campaign=contact.get("utm_campaign") or "",
+            utm_source=contact.get("utm_source") or "",
+            utm_medium=contact.get("utm_medium") or "",
+            utm_content=contact.get("utm_content") or ""
+        )
+
+    @classmethod
+    def from_activecampaign(cls, contact: dict, utms: dict):
+        """Contato da API de contatos do ActiveCampaign com as UTMs já indexadas ({atributo: valor})."""
+        return cls(
+            email=contact.get("email"),
+            phone=contact.get("phone"),
+            first_name=contact.get("firstName") or "",
+            last_name=contact.get("lastName") or "",
+            utm_campaign=utms.get("utm_campaign") or "",
+            utm_source=utms.get("utm_source") or "",
+            utm_medium=utms.get("utm_medium") or "",
+            utm_content=utms.get("utm_content") or "",
+            created_at=contact.get("created_timestamp") or "",
+            updated_at=contact.get("udate") or contact.get("updated_timestamp") or contact.get("created_timestamp") or ""
+        )
+
+    @classmethod
+    def from_contact_event(cls, event: dict):
+        """
+        Evento do webhook contactAC como guardado no Data Lake (form achatado: contact[email],
+        contact[first_name], contact[fields][utm_campaign]...).
+        """
+        return cls(
+            email=event.get("contact[email]"),
+            phone=event.get("contact[phone]"),
+            first_name=event.get("contact[first_name]") or "Desconhecido",
+            last_name=event.get("contact[last_name]") or "",
+            utm_campaign=event.get("contact[fields][utm_campaign]") or "",
+            utm_source=event.get("contact[fields][utm_source]") or "",
+            utm_medium=event.get("contact[fields][utm_medium]") or "",
+            utm_content=event.get("contact[fields][utm_content]") or "",
+            created_at=event.get("date_time") or ""
+        )
+
+    @classmethod
+    def from_row(cls, row: dict):
+        """
+        Linha de um arquivo de importação (CSV ou NDJSON). Aceita os nomes dos campos do
+        modelo e os do ActiveCampaign (firstName, lastName); colunas desconhecidas são ignoradas.
+        """
+        values = {}
+        for key, value in row.items():
+            if key is None or value is None or value == "":
+                continue
+            key = key.strip()
+            name = _ROW_ALIASES.get(key, key.lower())
+            if name in _FIELD_NAMES:
+                values[name] = str(value).strip()
+        return cls(**values)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Inverso de `to_dict` (itens da fila de ingestão); chaves desconhecidas são ignoradas."""
+        return cls(**{name: data[name] for name in _FIELD_NAMES if data.get(name) is not None})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in _FIELD_NAMES}
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}".strip()
+
+    @property
+    def deal_title(self):
+        return f"Negócio com {self.utm_campaign or 'Lead'}"
+
+    @property
+    def has_contact_channel(self):
+        """Lead com email ou telefone (sem nenhum dos dois não há como deduplicar nem contatar)."""
+        return bool(self.email or self.phone)
+
+
+_FIELD_NAMES = tuple(field.name for field in fields(Lead))
+
+_ROW_ALIASES = {"firstName": "first_name", "lastName": "last_name"}
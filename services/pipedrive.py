@@ -1,117 +1,184 @@
-import requests
+import logging
 from fastapi import HTTPException
-from config.settings import (
-    PIPEDRIVE_API_KEY, 
-    PIPEDRIVE_API_URL, 
-    PIPEDRIVE_API_URL_deal,
-    CUSTOM_FIELDS,
-    LIST_TO_PIPELINE
-)
-
-def get_first_stage_id(pipeline_id):
-    """Obtém o primeiro estágio disponível para o funil especificado."""
-    url = f"https://api.pipedrive.com/v1/stages?pipeline_id={pipeline_id}&api_token={PIPEDRIVE_API_KEY}"
-    response = requests.get(url)
-
-    if response.status_code != 200:
-        print(f"❌ Erro ao buscar estágios do Pipedrive: {response.status_code} - {response.text}")
-        return None
+from services import metrics, dedup, schema, stages
+from services.ratelimit import pipedrive_scheduler
+from services.models import Lead
+from config.settings import get_upstreams
 
-    stages = response.json().get("data", [])
-    if not stages:
-        print(f"❌ Erro: Nenhum estágio encontrado para o funil {pipeline_id}.")
-        return None
+logger = logging.getLogger(__name__)
 
-    return stages[0]["id"]
+# Itens por página nas listagens do Pipedrive
+PAGE_SIZE = 500
 
-def create_deal(person_id, utm_campaign, utm_source, pipeline_id):
-    """Cria um negócio (deal) no Pipedrive vinculado ao contato (person) no funil correto."""
-    stage_id = get_first_stage_id(pipeline_id)
-    
-    if not stage_id:
-        print(f"❌ Erro: Não foi possível encontrar um estágio para o funil {pipeline_id}.")
-        return None
 
-    url = f"{PIPEDRIVE_API_URL_deal}/deals?api_token={PIPEDRIVE_API_KEY}"
+class PipedriveError(Exception):
+    """Erro retornado pela API do Pipedrive (sem a URL da requisição, que traz o api_token)."""
+
+    def __init__(self, status_code: int, details: str):
+        super().__init__(f"Erro na API do Pipedrive: {status_code} - {details}")
+        self.status_code = status_code
+        self.details = details
+
+
+async def iter_pages(url: str):
+    """
+    Percorre uma listagem paginada do Pipedrive (start/limit), devolvendo os itens de cada página.
+    O status é conferido aqui, sem raise_for_status: o erro do httpx traz a URL, com o api_token,
+    e iria para os logs.
+    """
+    start = 0
+    while True:
+        response = await pipedrive_scheduler.request(
+            "GET",
+            url,
+            params={"api_token": get_upstreams().pipedrive_api_key, "start": start, "limit": PAGE_SIZE}
+        )
+        if response.status_code != 200:
+            raise PipedriveError(response.status_code, response.text)
+        body = response.json()
+        yield body.get("data") or []
 
-    custom_fields = {
-        CUSTOM_FIELDS.get("utm_campaign"): utm_campaign if utm_campaign else None,
-        CUSTOM_FIELDS.get("utm_source"): utm_source if utm_source else None
+        pagination = (body.get("additional_data") or {}).get("pagination") or {}
+        if not pagination.get("more_items_in_collection"):
+            return
+        start = pagination.get("next_start", start + PAGE_SIZE)
+
+
+def person_payload(lead: Lead):
+    """Corpo do POST /persons para o lead (chaves dos campos resolvidas pelo registro de schema)."""
+    data = {
+        "name": lead.name,
+        "visible_to": 3
     }
+    for key, attribute in schema.schema_registry.person_fields:
+        data[key] = getattr(lead, attribute)
+    return data
 
-    filtered_custom_fields = {k: v for k, v in custom_fields.items() if v}
 
+def deal_payload(lead: Lead, person_id, pipeline_id, stage_id, title: str = None):
+    """Corpo do POST /deals; as UTMs do negócio só vão quando preenchidas."""
     data = {
-        "title": f"Negócio com {utm_campaign if utm_campaign else 'Lead'}",
-        "person_id": person_id,  
+        "title": title or lead.deal_title,
+        "person_id": person_id,
         "value": 0,
         "pipeline_id": pipeline_id,
-        "stage_id": stage_id,  
-        "visible_to": 3,  
-        **filtered_custom_fields
+        "stage_id": stage_id,
+        "visible_to": 3
     }
+    for key, attribute in schema.schema_registry.deal_fields:
+        value = getattr(lead, attribute)
+        if value:
+            data[key] = value
+    return data
+
+
+async def get_first_stage_id(pipeline_id):
+    """Obtém o primeiro estágio disponível para o funil especificado (servido pelo registro de estágios)."""
+    try:
+        stage_id = await stages.stage_registry.first_stage_id(pipeline_id)
+    except Exception as e:
+        logger.error("Erro ao buscar estágios do Pipedrive: %s", e)
+        return None
+
+    if not stage_id:
+        logger.error("Nenhum estágio encontrado para o funil %s", pipeline_id)
+        return None
+
+    return stage_id
 
-    print(f"🔹 Enviando negócio para Pipedrive: {data}")
+
+def _is_stage_error(response):
+    """Erro do Pipedrive que aponta para o estágio ou o funil (e não para um campo ou a pessoa)."""
+    text = response.text.lower()
+    return "stage" in text or "pipeline" in text
+
+async def create_deal(person_id, lead: Lead, pipeline_id):
+    """Cria um negócio (deal) no Pipedrive vinculado ao contato (person) no funil correto."""
+    existing_deal_id = await dedup.dedup_index.find_deal(person_id, pipeline_id)
+    if existing_deal_id:
+        logger.info("Negócio já existe para a pessoa %s no funil %s: %s", person_id, pipeline_id, existing_deal_id)
+        metrics.duplicates_skipped.inc(kind="deal")
+        return existing_deal_id
+
+    stage_id = await get_first_stage_id(pipeline_id)
+    
+    if not stage_id:
+        logger.error("Não foi possível encontrar um estágio para o funil %s", pipeline_id)
+        return None
+
+    upstreams = get_upstreams()
+    url = f"{upstreams.pipedrive_deals_url}?api_token={upstreams.pipedrive_api_key}"
+
+    data = deal_payload(lead, person_id, pipeline_id, stage_id)
+
+    logger.debug("Enviando negócio para o Pipedrive", extra={"pipeline_id": pipeline_id, "person_id": person_id})
 
     headers = {
         "Content-Type": "application/json"
     }
 
-    response = requests.post(url, json=data, headers=headers)
+    response = await pipedrive_scheduler.request("POST", url, json=data, headers=headers)
+
+    if response.status_code in (400, 404, 422) and _is_stage_error(response) and await stages.stage_registry.invalidate():
+        # O estágio em cache pode ter sido removido: recarrega os estágios e tenta mais uma vez
+        fresh_stage_id = await get_first_stage_id(pipeline_id)
+        if fresh_stage_id and fresh_stage_id != stage_id:
+            data["stage_id"] = fresh_stage_id
+            response = await pipedrive_scheduler.request("POST", url, json=data, headers=headers)
 
     if response.status_code != 201 and response.status_code != 200:
-        print(f"❌ Erro ao criar negócio no Pipedrive: {response.status_code} - {response.text}")
+        logger.error("Erro ao criar negócio no Pipedrive: %s - %s", response.status_code, response.text)
         return None
 
     deal_id = response.json().get("data", {}).get("id")
-    print(f"✅ Negócio criado! ID: {deal_id}")
+    await dedup.dedup_index.remember_deal(person_id, pipeline_id, deal_id)
+    metrics.deals_created.inc()
+    logger.info("Negócio criado: %s", deal_id)
     return deal_id
 
-def create_person(contact_data):
-    """Cria uma pessoa no Pipedrive com os dados do contato."""
-    data = {
-        "name": f"{contact_data['first_name']} {contact_data['last_name']}".strip(),
-        "visible_to": 3,
-        CUSTOM_FIELDS["email_personalizado"]: contact_data["email"],
-        CUSTOM_FIELDS["telefone_personalizado"]: contact_data["phone"],
-        CUSTOM_FIELDS["utm_campaign"]: contact_data["utm_campaign"],
-        CUSTOM_FIELDS["utm_source"]: contact_data["utm_source"],
-        CUSTOM_FIELDS["utm_medium"]: contact_data["utm_medium"],
-        CUSTOM_FIELDS["utm_content"]: contact_data["utm_content"]
-    }
+async def create_person(lead: Lead):
+    """Cria uma pessoa no Pipedrive com os dados do contato (ou reaproveita a já conhecida)."""
+    existing_person_id = await dedup.dedup_index.find_person(lead.email, lead.phone)
+    if existing_person_id:
+        metrics.duplicates_skipped.inc(kind="person")
+        return existing_person_id, None
+
+    data = person_payload(lead)
 
-    url = f"{PIPEDRIVE_API_URL}/persons?api_token={PIPEDRIVE_API_KEY}"
-    response = requests.post(url, json=data)
+    upstreams = get_upstreams()
+    url = f"{upstreams.pipedrive_persons_url}?api_token={upstreams.pipedrive_api_key}"
+    response = await pipedrive_scheduler.request("POST", url, json=data)
 
     if response.status_code != 201 and response.status_code != 200:
         return None, response.text
 
-    return response.json().get("data", {}).get("id"), None
+    person_id = response.json().get("data", {}).get("id")
+    await dedup.dedup_index.remember_person(lead.email, lead.phone, person_id)
+    metrics.persons_created.inc()
+    return person_id, None
 
 
 
 
 
 # Função para o webhoook
-def create_contact_with_custom_fields(contact_data: dict):
+async def create_contact_with_custom_fields(lead: Lead):
     """
     Cria um contato no Pipedrive com campos personalizados.
+    Se o email/telefone já estiver no índice de deduplicação, reaproveita a pessoa existente.
     """
-    contact_payload = {
-        "name": f"{contact_data['first_name']} {contact_data['last_name']}".strip(),
-        "visible_to": 3,
-        CUSTOM_FIELDS["email_personalizado"]: contact_data["email"],
-        CUSTOM_FIELDS["telefone_personalizado"]: contact_data["phone"],
-        CUSTOM_FIELDS["utm_campaign"]: contact_data["utm_campaign"],
-        CUSTOM_FIELDS["utm_source"]: contact_data["utm_source"],
-        CUSTOM_FIELDS["utm_medium"]: contact_data["utm_medium"],
-        CUSTOM_FIELDS["utm_content"]: contact_data["utm_content"]
-    }
-
-    url = f"{PIPEDRIVE_API_URL}/persons?api_token={PIPEDRIVE_API_KEY}"
-    response = requests.post(
+    existing_person_id = await dedup.dedup_index.find_person(lead.email, lead.phone)
+    if existing_person_id:
+        logger.info("Contato já existe no Pipedrive: %s", existing_person_id)
+        metrics.duplicates_skipped.inc(kind="person")
+        return existing_person_id
+
+    upstreams = get_upstreams()
+    url = f"{upstreams.pipedrive_persons_url}?api_token={upstreams.pipedrive_api_key}"
+    response = await pipedrive_scheduler.request(
+        "POST",
         url, 
-        json=contact_payload, 
+        json=person_payload(lead), 
         headers={"Content-Type": "application/json"}
     )
 
@@ -121,25 +188,32 @@ def create_contact_with_custom_fields(contact_data: dict):
             detail=f"Erro ao criar contato no Pipedrive: {response.text}"
         )
 
-    return response.json().get("data", {}).get("id")
+    person_id = response.json().get("data", {}).get("id")
+    await dedup.dedup_index.remember_person(lead.email, lead.phone, person_id)
+    metrics.persons_created.inc()
+    return person_id
 
-def create_deal_with_pipeline(person_id: int, pipeline_info: dict, title: str):
+async def create_deal_with_pipeline(person_id: int, lead: Lead, pipeline_info: dict, title: str = None):
     """
     Cria um negócio (Deal) no Pipedrive com pipeline e estágio específicos.
     """
-    deal_payload = {
-        "title": title,
-        "person_id": person_id,
-        "value": 0,
-        "pipeline_id": pipeline_info["pipeline_id"],
-        "stage_id": pipeline_info["stage_id"],
-        "visible_to": 3
-    }
+    existing_deal_id = await dedup.dedup_index.find_deal(person_id, pipeline_info["pipeline_id"])
+    if existing_deal_id:
+        logger.info(
+            "Negócio já existe para a pessoa %s no funil %s: %s",
+            person_id, pipeline_info["pipeline_id"], existing_deal_id
+        )
+        metrics.duplicates_skipped.inc(kind="deal")
+        return existing_deal_id
 
-    url = f"{PIPEDRIVE_API_URL_deal}/deals?api_token={PIPEDRIVE_API_KEY}"
-    response = requests.post(
+    data = deal_payload(lead, person_id, pipeline_info["pipeline_id"], pipeline_info["stage_id"], title)
+
+    upstreams = get_upstreams()
+    url = f"{upstreams.pipedrive_deals_url}?api_token={upstreams.pipedrive_api_key}"
+    response = await pipedrive_scheduler.request(
+        "POST",
         url, 
-        json=deal_payload, 
+        json=data, 
         headers={"Content-Type": "application/json"}
     )
 
@@ -149,4 +223,7 @@ def create_deal_with_pipeline(person_id: int, pipeline_info: dict, title: str):
             detail=f"Erro ao criar Deal no Pipedrive: {response.text}"
         )
 
-    return response.json().get("data", {}).get("id")
\ No newline at end of file
+    deal_id = response.json().get("data", {}).get("id")
+    await dedup.dedup_index.remember_deal(person_id, pipeline_info["pipeline_id"], deal_id)
+    metrics.deals_created.inc()
+    return deal_id
\ No newline at end of file
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import random
+from contextlib import contextmanager
+from services import http_client, metrics
+from services.shared_state import shared_state
+from config.settings import (
+    PIPEDRIVE_RATE_LIMIT,
+    PIPEDRIVE_RATE_WINDOW_SECONDS,
+    PIPEDRIVE_BULK_RESERVE,
+    PIPEDRIVE_MAX_RETRIES,
+    PIPEDRIVE_BACKOFF_BASE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Filas de prioridade: webhooks em tempo real passam na frente das sincronizações em lote
+LANE_REALTIME = "realtime"
+LANE_BULK = "bulk"
+
+current_lane = contextvars.ContextVar("pipedrive_lane", default=LANE_REALTIME)
+
+
+@contextmanager
+def lane(name: str):
+    """Executa as chamadas ao Pipedrive do bloco (e das tasks criadas nele) na fila informada."""
+    token = current_lane.set(name)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+def _header_number(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    Token bucket compartilhado por todas as chamadas a um upstream.
+    O tamanho e o saldo do bucket acompanham os cabeçalhos x-ratelimit-* das respostas;
+    em 429 o bucket é pausado e a requisição é repetida com backoff exponencial e jitter.
+    A fila bulk não consome a reserva da fila realtime e cede a vez quando há webhooks esperando.
+    O saldo fica no estado compartilhado: com o backend sqlite, todos os workers do host
+    consomem o mesmo orçamento (a prioridade realtime/bulk continua sendo por processo).
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        limit: int = PIPEDRIVE_RATE_LIMIT,
+        window: float = PIPEDRIVE_RATE_WINDOW_SECONDS,
+        bulk_reserve: float = PIPEDRIVE_BULK_RESERVE,
+        max_retries: int = PIPEDRIVE_MAX_RETRIES,
+        backoff_base: float = PIPEDRIVE_BACKOFF_BASE_SECONDS,
+        state=None
+    ):
+        self.upstream = upstream
+        self.capacity = float(limit)
+        self.window = window
+        self.bulk_reserve = bulk_reserve
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.state = state or shared_state
+        self.retries = 0
+        self._realtime_waiting = 0
+
+    @property
+    def rate(self):
+        return self.capacity / self.window
+
+    async def acquire(self, lane_name: str = LANE_REALTIME):
+        """Aguarda um token na fila informada."""
+        realtime = lane_name != LANE_BULK
+        if realtime:
+            self._realtime_waiting += 1
+        try:
+            while True:
+                if not realtime and self._realtime_waiting:
+                    await asyncio.sleep(1 / self.rate)
+                    continue
+
+                reserve = 0.0 if realtime else self.capacity * self.bulk_reserve
+                wait = await self.state.take_token(self.upstream, self.capacity, self.rate, reserve)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            if realtime:
+                self._realtime_waiting -= 1
+
+    async def update(self, headers):
+        """Ajusta o bucket pelos cabeçalhos x-ratelimit-limit/-remaining/-reset."""
+        limit = _header_number(headers, "x-ratelimit-limit")
+        remaining = _header_number(headers, "x-ratelimit-remaining")
+        reset = _header_number(headers, "x-ratelimit-reset")
+
+        if limit:
+            self.capacity = limit
+        if limit is None and remaining is None:
+            return
+        pause_for = reset if remaining is not None and remaining <= 0 else None
+        await self.state.adjust_bucket(self.upstream, self.capacity, remaining, pause_for)
+
+    def _backoff(self, response, attempt):
+        retry_after = _header_number(response.headers, "retry-after") or _header_number(response.headers, "x-ratelimit-reset")
+        delay = retry_after if retry_after else self.backoff_base * (2 ** attempt)
+        return delay * (1 + random.random() * 0.5)
+
+    async def request(self, method: str, url: str, **kwargs):
+        """Executa a requisição respeitando o bucket e repetindo em caso de 429."""
+        lane_name = current_lane.get()
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(lane_name)
+            response = await http_client.request(self.upstream, method, url, **kwargs)
+            await self.update(response.headers)
+
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+            delay = self._backoff(response, attempt)
+            await self.state.adjust_bucket(self.upstream, self.capacity, remaining=0, pause_for=delay)
+            self.retries += 1
+            metrics.upstream_retries.inc(upstream=self.upstream, reason="429")
+            logger.warning(
+                "Pipedrive respondeu 429 (%s); nova tentativa em %.1fs (%s/%s)",
+                lane_name, delay, attempt + 1, self.max_retries
+            )
+        return response
+
+    async def snapshot(self):
+        bucket = await self.state.bucket(self.upstream, self.capacity, self.rate)
+        return {
+            "backend": self.state.name,
+            "capacity": bucket["capacity"],
+            "window_seconds": self.window,
+            "tokens": round(bucket["tokens"], 2),
+            "paused_for_seconds": round(bucket["paused_for_seconds"], 2),
+            "realtime_waiting": self._realtime_waiting,
+            "retries": self.retries
+        }
+
+
+pipedrive_scheduler = RateLimitScheduler(http_client.PIPEDRIVE)
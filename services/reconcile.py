@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+import itertools
+import logging
+from services import leads, ratelimit
+from services.dedup import dedup_index
+from services.jobs import job_store
+from services.models import Lead
+from services.routing import routing_table
+from services.ActiveCampaign.datalakeArchive import datalake_archive
+from config.settings import RECONCILE_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Eventos do contactAC que não representam um lead a criar
+IGNORED_EVENT_TYPES = {"unsubscribe", "bounce"}
+
+# Eventos lidos do arquivo por vez (a leitura do disco fica fora do event loop)
+READ_BATCH_SIZE = 500
+
+PRESENT = "present"
+MISSING_PERSON = "missing_person"
+MISSING_DEAL = "missing_deal"
+
+
+def _next_batch(events, size: int):
+    return list(itertools.islice(events, size))
+
+
+def _utc(value: datetime.datetime):
+    return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+
+def route_event(event: dict, funnel: str = None):
+    """(lead, pipeline_info, motivo do descarte ou None) de um evento arquivado."""
+    if event.get("type") in IGNORED_EVENT_TYPES:
+        return None, None, "ignored_type"
+
+    lead = Lead.from_contact_event(event)
+    if not lead.has_contact_channel:
+        return None, None, "no_contact"
+
+    if funnel:
+        pipeline_info = routing_table.for_funnel(funnel)
+    else:
+        list_id = event.get("list") or event.get("contact[list_id]")
+        pipeline_info = routing_table.for_list(list_id) if list_id else None
+    if pipeline_info is None:
+        return None, None, "unroutable"
+    return lead, pipeline_info, None
+
+
+async def _bounded(items, fn, concurrency: int):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item):
+        async with semaphore:
+            return await fn(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+async def _status(lead: Lead, pipeline_info: dict):
+    person_id = await dedup_index.find_person(lead.email, lead.phone)
+    if not person_id:
+        return MISSING_PERSON
+    if not await dedup_index.find_deal(person_id, pipeline_info["pipeline_id"]):
+        return MISSING_DEAL
+    return PRESENT
+
+
+async def diff(
+    since: datetime.datetime,
+    until: datetime.datetime,
+    funnel: str = None,
+    concurrency: int = None,
+    archive=None
+):
+    """
+    Compara os eventos arquivados entre `since` e `until` com o índice de deduplicação.
+    Cada lead (email/telefone + funil) é considerado uma vez, pelo evento mais recente.
+    Retorna (relatório, [(lead, pipeline_info, status)] dos leads que faltam no Pipedrive).
+    """
+    archive = archive or datalake_archive
+    since, until = _utc(since), _utc(until)
+    skipped = {"ignored_type": 0, "no_contact": 0, "unroutable": 0}
+    unique = {}
+    events_read = 0
+
+    events = archive.iter_events(since, until)
+    try:
+        while True:
+            batch = await asyncio.to_thread(_next_batch, events, READ_BATCH_SIZE)
+            if not batch:
+                break
+            events_read += len(batch)
+            for event in batch:
+                lead, pipeline_info, reason = route_event(event, funnel)
+                if reason:
+                    skipped[reason] += 1
+                else:
+                    unique[leads.flight_key(lead, pipeline_info)] = (lead, pipeline_info, event.get("received_at"))
+    finally:
+        events.close()
+
+    entries = list(unique.values())
+    statuses = await _bounded(
+        entries, lambda entry: _status(entry[0], entry[1]), concurrency or RECONCILE_CONCURRENCY
+    )
+
+    counts = {PRESENT: 0, MISSING_PERSON: 0, MISSING_DEAL: 0}
+    missing = []
+    for (lead, pipeline_info, received_at), status in zip(entries, statuses):
+        counts[status] += 1
+        if status != PRESENT:
+            missing.append((lead, pipeline_info, status, received_at))
+
+    report = {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "events": events_read,
+        "skipped": skipped,
+        "leads": len(entries),
+        **counts
+    }
+    return report, missing
+
+
+def describe(missing: list, limit: int = 100):
+    """Itens do diff para o relatório do dry-run."""
+    return [
+        {
+            "email": lead.email,
+            "phone": lead.phone,
+            "pipeline_id": pipeline_info["pipeline_id"],
+            "status": status,
+            "received_at": received_at
+        }
+        for lead, pipeline_info, status, received_at in missing[:limit]
+    ]
+
+
+async def replay(lead: Lead, pipeline_info: dict):
+    """Recria um lead pelo mesmo caminho do webhook (a deduplicação reaproveita a pessoa que já existir)."""
+    try:
+        await leads.create_lead(lead, pipeline_info)
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        return {"email": lead.email, "error": detail}
+    return None
+
+
+async def run_reconcile_job(job_id: str, params: dict, checkpoint: dict = None):
+    """
+    Runner dos jobs de reconciliação: calcula o diff da janela e recria só os leads que faltam,
+    com no máximo `concurrency` em paralelo, na fila bulk do rate limit.
+    Não há checkpoint: um job retomado recalcula o diff, que já não inclui os leads recriados.
+    """
+    concurrency = params.get("concurrency") or RECONCILE_CONCURRENCY
+    report, missing = await diff(
+        datetime.datetime.fromisoformat(params["since"]),
+        datetime.datetime.fromisoformat(params["until"]),
+        params.get("funnel"),
+        concurrency
+    )
+    logger.info("Reconciliação %s: %s", job_id, report)
+    await job_store.progress(job_id, total=len(missing))
+
+    chunk_size = max(concurrency * 10, 100)
+    with ratelimit.lane(ratelimit.LANE_BULK):
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            results = await _bounded(chunk, lambda entry: replay(entry[0], entry[1]), concurrency)
+            errors = [result for result in results if result]
+            await job_store.progress(
+                job_id, processed=len(chunk) - len(errors), failed=len(errors), errors=errors
+            )
+
+
+async def start_reconcile_job(
+    since: datetime.datetime,
+    until: datetime.datetime,
+    funnel: str = None,
+    concurrency: int = None
+):
+    """Cria e inicia o job que recria os leads da janela que faltam no Pipedrive. Retorna o id do job."""
+    return await job_store.submit("reconcile", {
+        "since": _utc(since).isoformat(),
+        "until": _utc(until).isoformat(),
+        "funnel": funnel,
+        "concurrency": concurrency
+    })
+
+
+job_store.register("reconcile", run_reconcile_job)
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import time
+from config.settings import WEBHOOK_ROUTING_PATH, WEBHOOK_ROUTING_RELOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Paths fixos de /webhook que não podem ser usados como nome de funil
+RESERVED_FUNNELS = {"activecampaign"}
+
+
+class RoutingError(ValueError):
+    """Tabela de roteamento inválida."""
+
+
+def compile_routes(table: dict):
+    """
+    Valida a tabela e devolve os índices prontos para consulta:
+    ({funil: pipeline_info}, {list_id: pipeline_info}).
+    """
+    funnels = table.get("funnels")
+    if not isinstance(funnels, dict) or not funnels:
+        raise RoutingError("a tabela precisa de um objeto 'funnels' não vazio")
+
+    by_funnel, by_list = {}, {}
+    for name, funnel in funnels.items():
+        if name in RESERVED_FUNNELS:
+            raise RoutingError(f"o nome de funil '{name}' é reservado")
+        try:
+            pipeline_info = {"pipeline_id": int(funnel["pipeline_id"]), "stage_id": int(funnel["stage_id"])}
+        except (KeyError, TypeError, ValueError):
+            raise RoutingError(f"funil '{name}' sem pipeline_id/stage_id inteiros")
+
+        by_funnel[name] = pipeline_info
+        for list_id in funnel.get("lists", []):
+            list_id = str(list_id)
+            if list_id in by_list:
+                raise RoutingError(f"lista {list_id} associada a mais de um funil")
+            by_list[list_id] = pipeline_info
+    return by_funnel, by_list
+
+
+class RoutingTable:
+    """
+    Roteamento dos webhooks carregado de um arquivo JSON (config/routing.json).
+    O arquivo é relido quando muda (verificado no máximo a cada `reload_interval` segundos)
+    ou por POST /admin/routing/reload; uma versão inválida é descartada e a anterior continua valendo.
+    """
+
+    def __init__(self, path: str = WEBHOOK_ROUTING_PATH, reload_interval: float = WEBHOOK_ROUTING_RELOAD_SECONDS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._by_funnel = {}
+        self._by_list = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._loaded_at = None
+
+    def load(self):
+        """Lê e compila a tabela; levanta RoutingError se o arquivo for inválido."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, encoding="utf-8") as file:
+                table = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise RoutingError(f"não foi possível ler {self.path}: {e}")
+
+        self._by_funnel, self._by_list = compile_routes(table)
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        self._loaded_at = time.time()
+        logger.info(
+            "Tabela de roteamento carregada: %s funis, %s listas",
+            len(self._by_funnel), len(self._by_list)
+        )
+
+    def reload(self):
+        """Recarrega mantendo a tabela atual se a nova for inválida. Retorna True se recarregou."""
+        try:
+            self.load()
+            return True
+        except RoutingError as e:
+            logger.error("Tabela de roteamento não recarregada: %s", e)
+            self._checked_at = time.monotonic()
+            return False
+
+    def _maybe_reload(self):
+        if self._loaded_at is None:
+            self.load()
+            return
+        if not self.reload_interval or time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def for_list(self, list_id):
+        """pipeline_info da lista do ActiveCampaign, ou None se não estiver configurada."""
+        self._maybe_reload()
+        return self._by_list.get(str(list_id))
+
+    def for_funnel(self, name: str):
+        """pipeline_info do funil, ou None se não estiver configurado."""
+        self._maybe_reload()
+        return self._by_funnel.get(name)
+
+    def pipelines(self):
+        """Funis configurados, no formato esperado por stages.warm_up."""
+        self._maybe_reload()
+        return {f"webhook/{name}": info for name, info in self._by_funnel.items()}
+
+    def snapshot(self):
+        return {
+            "path": self.path,
+            "loaded_at": self._loaded_at,
+            "reload_interval_seconds": self.reload_interval,
+            "funnels": self._by_funnel,
+            "lists": self._by_list
+        }
+
+
+routing_table = RoutingTable()
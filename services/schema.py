@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from services import pipedrive
+from services.shared_cache import SharedCache
+from services.ActiveCampaign.fieldCache import field_cache
+from config.settings import (
+    get_upstreams,
+    FIELD_TITLES,
+    UTM_FIELDS,
+    CUSTOM_FIELDS,
+    DEAL_CUSTOM_FIELDS,
+    SCHEMA_CACHE_TTL,
+    SCHEMA_STRICT
+)
+
+logger = logging.getLogger(__name__)
+
+PIPEDRIVE_PERSON = "pipedrive_person"
+PIPEDRIVE_DEAL = "pipedrive_deal"
+ACTIVECAMPAIGN = "activecampaign"
+
+# Campos lógicos de cada entidade: (nome lógico, atributo do Lead).
+# Atributo None: o campo só é exposto pela consulta de contato, não vai para o Lead
+ENTITIES = {
+    PIPEDRIVE_PERSON: (
+        ("email_personalizado", "email"),
+        ("telefone_personalizado", "phone"),
+        ("utm_campaign", "utm_campaign"),
+        ("utm_source", "utm_source"),
+        ("utm_medium", "utm_medium"),
+        ("utm_content", "utm_content")
+    ),
+    PIPEDRIVE_DEAL: (
+        ("utm_campaign", "utm_campaign"),
+        ("utm_source", "utm_source")
+    ),
+    ACTIVECAMPAIGN: (
+        ("utm_campaign", "utm_campaign"),
+        ("utm_source", "utm_source"),
+        ("utm_medium", "utm_medium"),
+        ("utm_content", "utm_content"),
+        ("utm_term", None)
+    )
+}
+
+# Chaves esperadas de cada entidade (configuração)
+EXPECTED_KEYS = {
+    PIPEDRIVE_PERSON: CUSTOM_FIELDS,
+    PIPEDRIVE_DEAL: DEAL_CUSTOM_FIELDS,
+    ACTIVECAMPAIGN: UTM_FIELDS
+}
+
+# Campos cuja ausência não é uma divergência
+OPTIONAL_FIELDS = {"utm_term"}
+
+
+def resolve(entity: str, definitions: dict = None):
+    """
+    Resolve os campos lógicos da entidade nas definições carregadas ({chave: título}):
+    pela chave esperada e, se ela não existir, pelo título. Sem definições, valem as chaves esperadas.
+    Retorna ({nome lógico: chave}, campos não encontrados, campos encontrados com outra chave).
+    """
+    expected = EXPECTED_KEYS[entity]
+    keys, missing, remapped = {}, [], []
+    if definitions is None:
+        return {logical: expected[logical] for logical, _ in ENTITIES[entity] if logical in expected}, missing, remapped
+
+    keys_by_title = {title: key for key, title in definitions.items() if title}
+    for logical, _ in ENTITIES[entity]:
+        expected_key = expected.get(logical)
+        title = FIELD_TITLES.get(logical)
+        if expected_key and expected_key in definitions:
+            keys[logical] = expected_key
+        elif title in keys_by_title:
+            keys[logical] = keys_by_title[title]
+            if expected_key:
+                remapped.append(f"{entity}.{logical}: chave {expected_key} não existe, usando {keys[logical]} ('{title}')")
+        else:
+            if expected_key:
+                keys[logical] = expected_key
+            if logical not in OPTIONAL_FIELDS:
+                missing.append(f"{entity}.{logical}: campo '{title}' não encontrado")
+    return keys, missing, remapped
+
+
+class SchemaRegistry(SharedCache):
+    """
+    Registro das definições de campos personalizados do Pipedrive (pessoas e negócios) e do ActiveCampaign.
+    Carregado no startup e recarregado em background a cada TTL. Cada carga resolve os nomes
+    lógicos nas chaves reais e pré-calcula as tuplas (chave, atributo do Lead) usadas na
+    montagem dos payloads, que assim não consultam metadados durante as requisições.
+    Enquanto nada foi carregado, valem as chaves esperadas da configuração.
+    """
+
+    shared_key = "schema_fields"
+
+    def __init__(self, ttl: int = SCHEMA_CACHE_TTL):
+        super().__init__(ttl)
+        self._task = None
+        self._use(None)
+
+    def _use(self, definitions: dict):
+        keys, missing, remapped = {}, [], []
+        for entity in ENTITIES:
+            keys[entity], entity_missing, entity_remapped = resolve(
+                entity, definitions.get(entity) if definitions else None
+            )
+            missing.extend(entity_missing)
+            remapped.extend(entity_remapped)
+
+        self._keys = keys
+        self.missing, self.remapped = missing, remapped
+        # Tuplas (chave, atributo do Lead) dos montadores de payload
+        self.person_fields = self._layout(PIPEDRIVE_PERSON)
+        self.deal_fields = self._layout(PIPEDRIVE_DEAL)
+        # {id do campo: atributo do Lead} das UTMs do ActiveCampaign, e todos os ids de UTM (inclusive utm_term)
+        self.activecampaign_fields = dict(self._layout(ACTIVECAMPAIGN))
+        self.activecampaign_ids = frozenset(keys[ACTIVECAMPAIGN].values())
+
+    def _layout(self, entity: str):
+        keys = self._keys[entity]
+        return tuple(
+            (keys[logical], attribute)
+            for logical, attribute in ENTITIES[entity]
+            if attribute and logical in keys
+        )
+
+    def key(self, entity: str, logical: str):
+        """Chave real de um campo lógico (None se não resolvido)."""
+        return self._keys[entity].get(logical)
+
+    async def _load_pipedrive(self, url: str):
+        """Definições de campos de uma entidade do Pipedrive ({chave: nome}, paginado)."""
+        definitions = {}
+        async for page in pipedrive.iter_pages(url):
+            for field in page:
+                definitions[field["key"]] = field.get("name")
+        return definitions
+
+    async def _fetch(self):
+        upstreams = get_upstreams()
+        # As três listagens são independentes: carregadas em paralelo
+        person_fields, deal_fields, activecampaign_fields = await asyncio.gather(
+            self._load_pipedrive(upstreams.pipedrive_person_fields_url),
+            self._load_pipedrive(upstreams.pipedrive_deal_fields_url),
+            field_cache.definitions()
+        )
+        return {
+            PIPEDRIVE_PERSON: person_fields,
+            PIPEDRIVE_DEAL: deal_fields,
+            ACTIVECAMPAIGN: activecampaign_fields
+        }
+
+    async def refresh(self):
+        """Carrega as definições de campos dos dois sistemas e recalcula as chaves."""
+        definitions = await super().refresh()
+        logger.info(
+            "Definições de campos carregadas: %s",
+            ", ".join(f"{entity}={len(fields)}" for entity, fields in definitions.items())
+        )
+        return definitions
+
+    def report(self):
+        """Registra as divergências entre os campos configurados e os dos sistemas."""
+        for problem in self.remapped:
+            logger.warning("Configuração de campo desatualizada — %s", problem)
+        for problem in self.missing:
+            logger.error("Configuração de campo inválida — %s", problem)
+
+    async def _reload(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                previous = (self.missing, self.remapped)
+                if not await self._load_shared():
+                    await self.refresh()
+                if (self.missing, self.remapped) != previous:
+                    self.report()
+            except Exception as e:
+                logger.error("Erro ao recarregar as definições de campos: %s", e)
+
+    async def start(self):
+        """
+        Carga inicial (ou a de outro worker, se recente), relatório de divergências e recarga periódica.
+        Com SCHEMA_STRICT, campos configurados que não existem impedem o startup.
+        """
+        try:
+            if not await self._load_shared():
+                await self.refresh()
+        except Exception as e:
+            logger.warning("Não foi possível carregar as definições de campos no startup: %s; usando as chaves configuradas", e)
+        else:
+            self.report()
+            if SCHEMA_STRICT and self.missing:
+                raise RuntimeError(f"Campos configurados não encontrados: {'; '.join(self.missing)}")
+        if self.ttl:
+            self._task = asyncio.create_task(self._reload())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def snapshot(self):
+        """Estado atual do registro (para o endpoint de administração)."""
+        age = time.monotonic() - self._loaded_at if self._loaded_at else None
+        return {
+            "loaded": bool(self._loaded_at),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "ttl_seconds": self.ttl,
+            "keys": self._keys,
+            "missing": self.missing,
+            "remapped": self.remapped
+        }
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from services.shared_state import shared_state
+
+# Intervalo mínimo entre recargas disparadas por um item desconhecido (ou por uma invalidação)
+MISS_REFRESH_INTERVAL = 60
+
+
+class SharedCache:
+    """
+    Base dos caches de metadados dos upstreams: carregados de uma vez e recarregados pelo TTL
+    ou quando um item não é encontrado. Cada carga é publicada no estado compartilhado
+    (`shared_key`), de onde os outros workers a reaproveitam.
+    Subclasses implementam `_fetch` (carga no upstream, em dados serializáveis em JSON)
+    e `_use` (aplica os dados carregados).
+    """
+
+    shared_key = ""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self):
+        raise NotImplementedError
+
+    def _use(self, data):
+        raise NotImplementedError
+
+    def _is_stale(self):
+        return not self._loaded_at or time.monotonic() - self._loaded_at > self.ttl
+
+    def _recently_loaded(self):
+        return self._loaded_at and time.monotonic() - self._loaded_at < MISS_REFRESH_INTERVAL
+
+    def _apply(self, data, loaded_at: float):
+        self._use(data)
+        # A idade é contada a partir da carga original, mesmo que ela tenha sido feita por outro worker
+        self._loaded_at = time.monotonic() - max(time.time() - loaded_at, 0.0)
+
+    async def refresh(self):
+        """Carrega do upstream e publica a carga para os outros workers. Retorna os dados carregados."""
+        data = await self._fetch()
+        loaded_at = time.time()
+        self._apply(data, loaded_at)
+        await shared_state.set("cache", self.shared_key, {"loaded_at": loaded_at, "data": data}, ttl=self.ttl)
+        return data
+
+    async def _load_shared(self):
+        """Adota a carga publicada por outro worker; retorna True se ela ainda estiver válida."""
+        entry = await shared_state.get("cache", self.shared_key)
+        if not entry or "data" not in entry:
+            return False
+        self._apply(entry["data"], entry["loaded_at"])
+        return not self._is_stale()
+
+    async def _ensure_loaded(self, missing: bool = False):
+        async with self._lock:
+            if self._is_stale() or (missing and not self._recently_loaded()):
+                if not missing and await self._load_shared():
+                    return
+                await self.refresh()
+
+    async def invalidate(self):
+        """
+        Força a recarga na próxima consulta (em todos os workers). Limitado a uma vez por
+        MISS_REFRESH_INTERVAL: retorna False, sem invalidar, se a carga acabou de ser feita.
+        """
+        if self._recently_loaded():
+            return False
+        self._loaded_at = 0.0
+        await shared_state.delete("cache", self.shared_key)
+        return True
@@ -0,0 +1,212 @@
+import json
+import logging
+import time
+from services.sqlite_store import SQLiteStore
+from config.settings import STATE_BACKEND, SHARED_STATE_PATH
+
+logger = logging.getLogger(__name__)
+
+# A cada quantas gravações as chaves expiradas são removidas
+_PURGE_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at);
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    capacity REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    paused_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def _take(bucket, capacity, rate, reserve, now):
+    """
+    Regra do token bucket, comum aos dois backends. `bucket` é [capacity, tokens, updated_at, paused_until].
+    Retorna 0 se o token foi consumido ou quantos segundos esperar antes de tentar de novo.
+    """
+    bucket[0] = capacity
+    bucket[1] = min(capacity, bucket[1] + (now - bucket[2]) * rate)
+    bucket[2] = now
+    if bucket[3] > now:
+        return bucket[3] - now
+    if bucket[1] - 1 >= reserve:
+        bucket[1] -= 1
+        return 0.0
+    return max((1 + reserve - bucket[1]) / rate, 0.005)
+
+
+def _adjust(bucket, capacity, remaining, pause_for, now):
+    if capacity:
+        bucket[0] = capacity
+    if remaining is not None:
+        bucket[1] = min(bucket[1], remaining)
+    if pause_for:
+        bucket[3] = max(bucket[3], now + pause_for)
+
+
+class InProcessState:
+    """Estado em memória do processo: o padrão com um único worker."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._kv = {}
+        self._buckets = {}
+
+    async def get(self, namespace: str, key: str):
+        entry = self._kv.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._kv[(namespace, key)]
+            return None
+        return value
+
+    async def set(self, namespace: str, key: str, value, ttl: float = None):
+        self._kv[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, namespace: str, key: str):
+        self._kv.pop((namespace, key), None)
+
+    async def count(self, namespace: str):
+        now = time.time()
+        return sum(
+            1 for (ns, _), (_, expires_at) in self._kv.items()
+            if ns == namespace and (expires_at is None or expires_at > now)
+        )
+
+    def _bucket(self, name, capacity):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [capacity, capacity, time.time(), 0.0]
+        return bucket
+
+    async def take_token(self, name: str, capacity: float, rate: float, reserve: float = 0.0):
+        return _take(self._bucket(name, capacity), capacity, rate, reserve, time.time())
+
+    async def adjust_bucket(self, name: str, capacity: float, remaining: float = None, pause_for: float = None):
+        _adjust(self._bucket(name, capacity), capacity, remaining, pause_for, time.time())
+
+    async def bucket(self, name: str, capacity: float, rate: float):
+        bucket = self._bucket(name, capacity)
+        now = time.time()
+        tokens = min(bucket[0], bucket[1] + (now - bucket[2]) * rate)
+        return {"capacity": bucket[0], "tokens": tokens, "paused_for_seconds": max(bucket[3] - now, 0.0)}
+
+    def close(self):
+        pass
+
+
+class SQLiteState(SQLiteStore):
+    """
+    Estado compartilhado pelos workers de um mesmo host num arquivo SQLite (WAL).
+    Cada operação é uma transação BEGIN IMMEDIATE, que serializa os processos pelo lock do arquivo.
+    Os valores são guardados em JSON.
+    """
+
+    name = "sqlite"
+    schema = _SCHEMA
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        super().__init__(path)
+        self._writes = 0
+
+    def _get(self, namespace, key):
+        row = self._execute(lambda conn: conn.execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone())
+        return json.loads(row[0]) if row else None
+
+    def _set(self, namespace, key, value, ttl):
+        now = time.time()
+        self._writes += 1
+        purge = self._writes % _PURGE_EVERY == 0
+
+        def write(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None)
+            )
+            if purge:
+                conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+        self._execute(write)
+
+    def _delete(self, namespace, key):
+        self._execute(lambda conn: conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)))
+
+    def _count(self, namespace):
+        return self._execute(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())
+        ).fetchone()[0])
+
+    def _with_bucket(self, name, capacity, fn):
+        def update(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT capacity, tokens, updated_at, paused_until FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            bucket = list(row) if row else [capacity, capacity, now, 0.0]
+            result = fn(bucket, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, capacity, tokens, updated_at, paused_until) VALUES (?, ?, ?, ?, ?)",
+                (name, *bucket)
+            )
+            return result
+        return self._execute(update)
+
+    def _take_token(self, name, capacity, rate, reserve):
+        return self._with_bucket(name, capacity, lambda bucket, now: _take(bucket, capacity, rate, reserve, now))
+
+    def _adjust_bucket(self, name, capacity, remaining, pause_for):
+        self._with_bucket(name, capacity, lambda bucket, now: _adjust(bucket, capacity, remaining, pause_for, now))
+
+    def _bucket(self, name, capacity, rate):
+        def read(bucket, now):
+            tokens = min(bucket[0], bucket[1] + (now - bucket[2]) * rate)
+            return {"capacity": bucket[0], "tokens": tokens, "paused_for_seconds": max(bucket[3] - now, 0.0)}
+        return self._with_bucket(name, capacity, read)
+
+    async def get(self, namespace: str, key: str):
+        return await self.run(self._get, namespace, key)
+
+    async def set(self, namespace: str, key: str, value, ttl: float = None):
+        await self.run(self._set, namespace, key, value, ttl)
+
+    async def delete(self, namespace: str, key: str):
+        await self.run(self._delete, namespace, key)
+
+    async def count(self, namespace: str):
+        return await self.run(self._count, namespace)
+
+    async def take_token(self, name: str, capacity: float, rate: float, reserve: float = 0.0):
+        return await self.run(self._take_token, name, capacity, rate, reserve)
+
+    async def adjust_bucket(self, name: str, capacity: float, remaining: float = None, pause_for: float = None):
+        await self.run(self._adjust_bucket, name, capacity, remaining, pause_for)
+
+    async def bucket(self, name: str, capacity: float, rate: float):
+        return await self.run(self._bucket, name, capacity, rate)
+
+
+def create_state(backend: str = STATE_BACKEND):
+    """Backend do estado compartilhado: "memory" (um processo) ou "sqlite" (vários workers no mesmo host)."""
+    if backend == "sqlite":
+        return SQLiteState()
+    if backend != "memory":
+        logger.warning("STATE_BACKEND desconhecido (%s); usando memória do processo", backend)
+    return InProcessState()
+
+
+shared_state = create_state()
@@ -0,0 +1,75 @@
+import asyncio
+from services.shared_state import shared_state
+
+
+def _state_key(key):
+    return "|".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes com a mesma chave: só a primeira executa, as outras
+    esperam e recebem o mesmo resultado (ou a mesma exceção). Resultados bem-sucedidos
+    ficam no estado compartilhado por `ttl` segundos (no `namespace` informado) para as
+    chamadas que chegam logo depois, inclusive em outros workers.
+    O agrupamento das chamadas em andamento é por processo.
+    """
+
+    def __init__(self, ttl: float, namespace: str = "singleflight", state=None):
+        self.ttl = ttl
+        self.namespace = namespace
+        self.state = state or shared_state
+        self._inflight = {}
+
+    async def cached(self, key):
+        """(True, resultado) se houver um resultado recente para a chave, senão (False, None)."""
+        if not self.ttl:
+            return False, None
+        entry = await self.state.get(self.namespace, _state_key(key))
+        if entry is None:
+            return False, None
+        return True, entry["result"]
+
+    async def do(self, key, fn, on_shared=None):
+        """
+        Executa `fn()` uma única vez por chave. `on_shared(source)` é chamado quando o
+        resultado vem de outra chamada ("inflight") ou do cache ("cache").
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            if on_shared:
+                on_shared("inflight")
+            # shield: o cancelamento de quem espera não cancela a execução compartilhada
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            hit, result = await self.cached(key)
+            if hit:
+                if on_shared:
+                    on_shared("cache")
+            else:
+                result = await fn()
+                if self.ttl:
+                    await self.state.set(self.namespace, _state_key(key), {"result": result}, ttl=self.ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marca a exceção como consumida quando ninguém estava esperando
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    async def stats(self):
+        return {
+            "inflight": len(self._inflight),
+            "cached": await self.state.count(self.namespace),
+            "ttl_seconds": self.ttl
+        }
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Base dos arquivos de estado local em SQLite (WAL).
+    Uma conexão por processo, protegida por lock; as operações rodam em
+    transações curtas e, pelo lado assíncrono, fora do event loop (`run`).
+    `migrations` são ALTERs aplicados na conexão a arquivos criados por versões anteriores.
+    """
+
+    schema = ""
+    migrations = ()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._conn_lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self.schema:
+                conn.executescript(self.schema)
+            for migration in self.migrations:
+                try:
+                    conn.execute(migration)
+                except sqlite3.OperationalError:
+                    pass  # coluna já existe
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, fn):
+        """Executa `fn(conn)` numa transação (BEGIN IMMEDIATE … COMMIT)."""
+        with self._conn_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def run(self, fn, *args):
+        """Executa uma operação síncrona do store numa thread."""
+        return await asyncio.to_thread(fn, *args)
+
+    def close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,105 @@
+import logging
+import time
+from services import pipedrive
+from services.shared_cache import SharedCache
+from config.settings import get_upstreams, PIPEDRIVE_STAGE_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class StageRegistry(SharedCache):
+    """
+    Registro em memória dos estágios de todos os funis do Pipedrive.
+    Carregado uma vez (no startup) e recarregado pelo TTL, por um funil desconhecido
+    ou quando o Pipedrive rejeita um estágio servido pelo cache.
+    """
+
+    shared_key = "pipedrive_stages"
+
+    def __init__(self, ttl: int = PIPEDRIVE_STAGE_CACHE_TTL):
+        super().__init__(ttl)
+        self._stages_by_pipeline = {}
+
+    async def _fetch(self):
+        """Estágios de todos os funis (paginado)."""
+        stages_by_pipeline = {}
+        async for page in pipedrive.iter_pages(get_upstreams().pipedrive_stages_url):
+            for stage in page:
+                stages_by_pipeline.setdefault(stage["pipeline_id"], []).append(stage)
+
+        for stages in stages_by_pipeline.values():
+            stages.sort(key=lambda stage: stage.get("order_nr", 0))
+        return stages_by_pipeline
+
+    def _use(self, stages_by_pipeline: dict):
+        # Em JSON as chaves viram texto: os ids dos funis voltam a ser inteiros
+        self._stages_by_pipeline = {int(pipeline_id): stages for pipeline_id, stages in stages_by_pipeline.items()}
+
+    async def refresh(self):
+        """Recarrega os estágios de todos os funis."""
+        stages_by_pipeline = await super().refresh()
+        logger.info("Estágios do Pipedrive carregados: %s funis", len(stages_by_pipeline))
+        return stages_by_pipeline
+
+    async def first_stage_id(self, pipeline_id):
+        """Retorna o primeiro estágio do funil, ou None se o funil não existir."""
+        pipeline_id = int(pipeline_id)
+        if self._is_stale():
+            await self._ensure_loaded()
+        if pipeline_id not in self._stages_by_pipeline:
+            await self._ensure_loaded(missing=True)
+
+        stages = self._stages_by_pipeline.get(pipeline_id)
+        return stages[0]["id"] if stages else None
+
+    def has_stage(self, pipeline_id, stage_id):
+        stages = self._stages_by_pipeline.get(int(pipeline_id), [])
+        return any(stage["id"] == int(stage_id) for stage in stages)
+
+    def validate(self, pipelines: dict):
+        """
+        Confere pares funil/estágio configurados ({origem: {"pipeline_id", "stage_id"}}).
+        Retorna a lista de inconsistências encontradas.
+        """
+        problems = []
+        for origin, info in pipelines.items():
+            if not self.has_stage(info["pipeline_id"], info["stage_id"]):
+                problems.append(
+                    f"{origin}: estágio {info['stage_id']} não existe no funil {info['pipeline_id']}"
+                )
+        return problems
+
+    def snapshot(self):
+        """Estado atual do registro (para o endpoint de administração)."""
+        age = time.monotonic() - self._loaded_at if self._loaded_at else None
+        return {
+            "loaded": bool(self._loaded_at),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "ttl_seconds": self.ttl,
+            "pipelines": {
+                pipeline_id: [
+                    {"id": stage["id"], "name": stage.get("name"), "order_nr": stage.get("order_nr")}
+                    for stage in stages
+                ]
+                for pipeline_id, stages in self._stages_by_pipeline.items()
+            }
+        }
+
+
+stage_registry = StageRegistry()
+
+
+async def warm_up(pipelines: dict):
+    """
+    Carrega os estágios no startup (ou adota os publicados por outro worker, se ainda válidos)
+    e registra os estágios configurados que não existem.
+    """
+    try:
+        if not await stage_registry._load_shared():
+            await stage_registry.refresh()
+    except Exception as e:
+        logger.warning("Não foi possível carregar os estágios do Pipedrive no startup: %s", e)
+        return
+
+    for problem in stage_registry.validate(pipelines):
+        logger.warning("Configuração de funil inválida — %s", problem)
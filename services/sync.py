@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+import logging
+from services import activecampaign, pipedrive, ratelimit
+from services.circuit_breaker import CircuitOpenError
+from services.jobs import job_store
+from services.models import Lead
+from services.sync_cursors import sync_cursors, parse_timestamp
+from config.settings import SYNC_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+PERSON_ERROR = "falha ao criar pessoa"
+DEAL_ERROR = "falha ao criar negócio"
+
+
+async def sync_contact(contact: Lead, pipeline_id: int):
+    """Cria a pessoa e, em seguida, o negócio de um único contato."""
+    person_id, error = await pipedrive.create_person(contact)
+
+    if error:
+        return {"email": contact.email, "error": error}
+
+    if not person_id:
+        return {"email": contact.email, "error": PERSON_ERROR}
+
+    deal_response = await pipedrive.create_deal(person_id, contact, pipeline_id)
+    result = {
+        "email": contact.email,
+        "person_id": person_id,
+        "deal": deal_response
+    }
+    # Sem o negócio o contato não está sincronizado: conta como falha e segura o cursor incremental
+    if not deal_response:
+        result["error"] = DEAL_ERROR
+    return result
+
+
+async def sync_batch(contacts: list, pipeline_id: int, concurrency: int = None):
+    """
+    Sincroniza um lote em duas fases: primeiro todas as pessoas do lote, depois todos
+    os negócios, disparados em paralelo pelo pool keep-alive. Falhas parciais ficam
+    no resultado do email correspondente.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or SYNC_CONCURRENCY))
+
+    async def bounded(coroutine):
+        async with semaphore:
+            try:
+                return await coroutine
+            except Exception as e:
+                return e
+
+    # Fase 1: pessoas
+    persons = await asyncio.gather(*(bounded(pipedrive.create_person(contact)) for contact in contacts))
+    _raise_circuit_open(persons)
+
+    results = []
+    pending_deals = []
+    for contact, person in zip(contacts, persons):
+        if isinstance(person, Exception):
+            results.append({"email": contact.email, "error": str(person)})
+            continue
+        person_id, error = person
+        if error or not person_id:
+            results.append({"email": contact.email, "error": error or PERSON_ERROR})
+        else:
+            result = {"email": contact.email, "person_id": person_id, "deal": None}
+            results.append(result)
+            pending_deals.append((result, contact))
+
+    # Fase 2: negócios das pessoas criadas
+    deals = await asyncio.gather(*(
+        bounded(pipedrive.create_deal(result["person_id"], contact, pipeline_id))
+        for result, contact in pending_deals
+    ))
+    _raise_circuit_open(deals)
+    for (result, _), deal in zip(pending_deals, deals):
+        if isinstance(deal, Exception):
+            result["error"] = str(deal)
+        elif not deal:
+            result["error"] = DEAL_ERROR
+        else:
+            result["deal"] = deal
+
+    return results
+
+
+def _raise_circuit_open(results):
+    """
+    Pipedrive com circuito aberto não é falha do contato: interrompe o trecho para o job
+    terminar no último checkpoint e poder ser retomado.
+    """
+    for result in results:
+        if isinstance(result, CircuitOpenError):
+            raise result
+
+
+async def sync_contacts(contacts, pipeline_id: int, concurrency: int = None, batch_size: int = None):
+    """
+    Sincroniza os contatos com no máximo `concurrency` contatos em paralelo.
+    Aceita uma lista ou um iterador assíncrono: os contatos são consumidos conforme
+    há vaga, então a memória não cresce com o tamanho da lista.
+    A ordem pessoa → negócio é mantida por contato e os resultados seguem a ordem de entrada.
+    Com `batch_size`, os contatos são agrupados em lotes processados por `sync_batch`.
+    """
+    if batch_size:
+        return await _sync_in_batches(contacts, pipeline_id, concurrency, batch_size)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency or SYNC_CONCURRENCY))
+    tasks = []
+
+    async def run(contact):
+        try:
+            return await sync_contact(contact, pipeline_id)
+        except CircuitOpenError as e:
+            return e
+        except Exception as e:
+            return {"email": contact.email, "error": str(e)}
+        finally:
+            semaphore.release()
+
+    # As chamadas ao Pipedrive da sincronização usam a fila bulk do agendador,
+    # para não atrasar os webhooks em tempo real
+    with ratelimit.lane(ratelimit.LANE_BULK):
+        try:
+            async for contact in _aiter(contacts):
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(run(contact)))
+        finally:
+            # Mesmo se a leitura falhar no meio, os contatos já iniciados terminam
+            results = await asyncio.gather(*tasks)
+
+    _raise_circuit_open(results)
+    return [result for result in results if result]
+
+
+async def _sync_in_batches(contacts, pipeline_id: int, concurrency: int, batch_size: int):
+    results = []
+    batch = []
+    with ratelimit.lane(ratelimit.LANE_BULK):
+        async for contact in _aiter(contacts):
+            batch.append(contact)
+            if len(batch) >= batch_size:
+                results.extend(await sync_batch(batch, pipeline_id, concurrency))
+                batch = []
+        if batch:
+            results.extend(await sync_batch(batch, pipeline_id, concurrency))
+    return results
+
+
+async def _aiter(contacts):
+    if hasattr(contacts, "__aiter__"):
+        async for contact in contacts:
+            yield contact
+    else:
+        for contact in contacts:
+            yield contact
+
+
+def _later(current, candidate):
+    """O mais recente entre dois timestamps ISO (None é ignorado)."""
+    candidate_at = parse_timestamp(candidate)
+    if candidate_at is None:
+        return current
+    if current is None or candidate_at > parse_timestamp(current):
+        return candidate_at.isoformat()
+    return current
+
+
+async def run_sync_job(job_id: str, params: dict, checkpoint: dict = None):
+    """
+    Runner dos jobs de sincronização. Cada página do ActiveCampaign é um trecho: ao fim dela
+    o progresso e o checkpoint (offset da próxima página) são gravados, e um job retomado
+    continua desse offset. Contatos de uma página interrompida no meio são reprocessados
+    e absorvidos pelo índice de deduplicação.
+    No modo incremental, o cursor da (lista, funil) só avança se nenhum contato do job falhar.
+    """
+    checkpoint = checkpoint or {}
+    list_id, pipeline_id = params["list_id"], params["pipeline_id"]
+    incremental = params["mode"] == "incremental"
+    offset = checkpoint.get("offset", 0)
+    high_water_mark = checkpoint.get("high_water_mark")
+    clean = checkpoint.get("clean", True)
+    meta = {}
+
+    pages = activecampaign.iter_contact_pages(
+        list_id, params.get("page_size"), params.get("updated_after"), offset, meta
+    )
+    async for page in pages:
+        results = await sync_contacts(page, pipeline_id, params.get("concurrency"), params.get("batch_size"))
+        failed = [result for result in results if "error" in result]
+
+        if incremental:
+            for contact in page:
+                high_water_mark = _later(high_water_mark, contact.updated_at)
+        offset += len(page)
+        clean = clean and not failed
+
+        await job_store.progress(
+            job_id,
+            processed=len(page) - len(failed),
+            failed=len(failed),
+            errors=[{"email": result["email"], "error": result["error"]} for result in failed],
+            total=meta.get("total"),
+            checkpoint={"offset": offset, "high_water_mark": high_water_mark, "clean": clean}
+        )
+
+    # Ao final, o total é o que foi efetivamente percorrido
+    await job_store.progress(job_id, total=offset)
+
+    if incremental and high_water_mark and clean:
+        cursor = await sync_cursors.advance(list_id, pipeline_id, high_water_mark)
+        logger.info("Cursor da lista %s no funil %s avançado para %s", list_id, pipeline_id, cursor)
+
+
+async def start_sync_job(
+    list_id: int,
+    pipeline_id: int,
+    mode: str = "full",
+    concurrency: int = None,
+    page_size: int = None,
+    batch_size: int = None
+):
+    """
+    Cria e inicia o job de sincronização da lista com o funil. Retorna o id do job.
+    No modo incremental, o filtro é fixado na criação (cursor atual menos um segundo de
+    sobreposição), para que um job retomado percorra o mesmo conjunto de contatos.
+    """
+    updated_after = None
+    if mode == "incremental":
+        cursor = await sync_cursors.get(list_id, pipeline_id)
+        if cursor:
+            updated_after = (parse_timestamp(cursor) - datetime.timedelta(seconds=1)).isoformat()
+
+    return await job_store.submit("sync", {
+        "list_id": list_id,
+        "pipeline_id": pipeline_id,
+        "mode": mode,
+        "updated_after": updated_after,
+        "concurrency": concurrency,
+        "page_size": page_size,
+        "batch_size": batch_size
+    })
+
+
+job_store.register("sync", run_sync_job)
@@ -0,0 +1,69 @@
+import datetime
+import time
+from services.sqlite_store import SQLiteStore
+from config.settings import SYNC_CURSOR_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    list_id INTEGER NOT NULL,
+    pipeline_id INTEGER NOT NULL,
+    cursor TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (list_id, pipeline_id)
+);
+"""
+
+
+def parse_timestamp(value):
+    """Converte as datas do ActiveCampaign em datetime com fuso (sem fuso = UTC)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+class SyncCursorStore(SQLiteStore):
+    """High-water mark (maior data de criação/alteração já sincronizada) por (lista, funil)."""
+
+    schema = _SCHEMA
+
+    def __init__(self, path: str = SYNC_CURSOR_PATH):
+        super().__init__(path)
+
+    def _get(self, list_id, pipeline_id):
+        row = self._execute(lambda conn: conn.execute(
+            "SELECT cursor FROM cursors WHERE list_id = ? AND pipeline_id = ?",
+            (list_id, pipeline_id)
+        ).fetchone())
+        return row[0] if row else None
+
+    def _advance(self, list_id, pipeline_id, cursor):
+        def advance(conn):
+            row = conn.execute(
+                "SELECT cursor FROM cursors WHERE list_id = ? AND pipeline_id = ?",
+                (list_id, pipeline_id)
+            ).fetchone()
+            # O cursor só anda para frente
+            if row and parse_timestamp(row[0]) >= parse_timestamp(cursor):
+                return row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO cursors (list_id, pipeline_id, cursor, updated_at) VALUES (?, ?, ?, ?)",
+                (list_id, pipeline_id, cursor, time.time())
+            )
+            return cursor
+        return self._execute(advance)
+
+    async def get(self, list_id: int, pipeline_id: int):
+        return await self.run(self._get, list_id, pipeline_id)
+
+    async def advance(self, list_id: int, pipeline_id: int, cursor: str):
+        """Move o cursor (numa transação) se `cursor` for mais recente que o atual. Retorna o cursor vigente."""
+        return await self.run(self._advance, list_id, pipeline_id, cursor)
+
+
+sync_cursors = SyncCursorStore()
@@ -0,0 +1,136 @@
+import json
+import logging
+from urllib.parse import parse_qsl
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from services import leads, http_client
+from services.circuit_breaker import CircuitOpenError
+from services.models import Lead
+from services.ingest_queue import ingest_queue
+from services.routing import routing_table
+from config.settings import WEBHOOK_INGEST_MODE
+from config.logging_config import log_payload
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Campos do formulário do ActiveCampaign → chaves do contato no payload JSON
+FORM_FIELDS = {
+    "contact_email": "email",
+    "contact[email]": "email",
+    "contact_phone": "phone",
+    "contact[phone]": "phone",
+    "contact_first_name": "firstName",
+    "contact[first_name]": "firstName",
+    "contact_last_name": "lastName",
+    "contact[last_name]": "lastName",
+    "contact_utm_campaign": "utm_campaign",
+    "contact_utm_source": "utm_source",
+    "contact_utm_medium": "utm_medium",
+    "contact_utm_content": "utm_content",
+    "list": "list_id"
+}
+
+
+async def read_payload(request: Request):
+    """
+    Lê o corpo uma única vez. JSON e application/x-www-form-urlencoded são decodificados
+    diretamente; o formulário vira o mesmo formato do JSON ({"contact": {...}}).
+    """
+    content_type = request.headers.get("content-type", "")
+    body = await request.body()
+
+    if content_type.startswith("application/json"):
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="JSON inválido.")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+    else:
+        fields = dict(parse_qsl(body.decode("utf-8", errors="replace"), keep_blank_values=True))
+
+    return {"contact": {FORM_FIELDS[key]: value for key, value in fields.items() if key in FORM_FIELDS}}
+
+
+async def enqueue_lead(lead: Lead, pipeline_info: dict):
+    """
+    Modo fila: valida o lead, grava na fila durável e responde 202.
+    Os workers criam o contato e o negócio no Pipedrive em background.
+    """
+    if not lead.has_contact_channel:
+        raise HTTPException(status_code=422, detail="Contato sem email e sem telefone.")
+
+    queue_id = await ingest_queue.put({"contact": lead.to_dict(), "pipeline": pipeline_info})
+    return JSONResponse(
+        status_code=202,
+        content={"message": "Lead recebido e enfileirado.", "queue_id": queue_id}
+    )
+
+
+async def dispatch_lead(lead: Lead, pipeline_info: dict):
+    """
+    Cria o contato e o negócio no funil (ou enfileira, no modo fila).
+    Com o circuito do Pipedrive aberto, o lead vai para a fila local em vez de esperar o upstream.
+    """
+    if WEBHOOK_INGEST_MODE == "queue" or http_client.breakers[http_client.PIPEDRIVE].is_open:
+        return await enqueue_lead(lead, pipeline_info)
+
+    try:
+        person_id = await leads.create_lead(lead, pipeline_info)
+    except CircuitOpenError as e:
+        logger.warning("Lead enfileirado: %s", e)
+        return await enqueue_lead(lead, pipeline_info)
+    return {"message": "Contato e negócio criados com sucesso!", "contact_id": person_id}
+
+
+@router.post("/webhook/activecampaign")
+async def activecampaign_webhook(request: Request):
+    """
+    Webhook do ActiveCampaign que recebe leads e os cria no Pipedrive automaticamente.
+    O funil é escolhido pela lista do contato (campo `list`), conforme a tabela de roteamento.
+    """
+    try:
+        payload = await read_payload(request)
+        log_payload(logger, "Payload recebido", payload)
+
+        contact_data = payload.get("contact", {})
+        list_id = contact_data.get("list_id")
+        logger.debug("List ID recebido: %s", list_id)
+
+        pipeline_info = routing_table.for_list(list_id) if list_id else None
+        if pipeline_info is None:
+            return {"error": "Lista não configurada para sincronização."}
+
+        return await dispatch_lead(Lead.from_webhook(contact_data), pipeline_info)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Erro no webhook: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/webhook/{funnel}")
+async def funnel_webhook(funnel: str, request: Request):
+    """
+    Webhook dedicado a um funil da tabela de roteamento (ex.: /webhook/pos_ia, /webhook/escola_ia).
+    Novos funis só precisam de uma entrada em config/routing.json.
+    """
+    pipeline_info = routing_table.for_funnel(funnel)
+    if pipeline_info is None:
+        raise HTTPException(status_code=404, detail=f"Funil '{funnel}' não configurado.")
+
+    try:
+        payload = await read_payload(request)
+        log_payload(logger, "Payload recebido", payload)
+        return await dispatch_lead(Lead.from_webhook(payload.get("contact", {})), pipeline_info)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Erro no webhook: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,15 @@
+#!/bin/sh
+# Produção com vários workers do uvicorn no mesmo host.
+# O backend sqlite compartilha entre os workers os caches, o orçamento do rate limit
+# do Pipedrive e os resultados recentes de leads; fila, índice de deduplicação e
+# cursores já ficam em SQLite no STATE_DIR.
+set -e
+
+export STATE_BACKEND="${STATE_BACKEND:-sqlite}"
+WORKERS="${WEB_CONCURRENCY:-$(nproc 2>/dev/null || echo 2)}"
+
+exec uvicorn main:app \
+    --host "${HOST:-0.0.0.0}" \
+    --port "${PORT:-8000}" \
+    --workers "$WORKERS" \
+    --no-access-log